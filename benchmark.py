@@ -0,0 +1,512 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from tile_viewer import (LAYER_FG, ContactSheet, JsonStreamReader, MapPreview, SheetCache, SpriteRangeIndex,
+                         TileRenderer, Tileset, TilesetCache, TilesetWatcher, TileTable, export_command,
+                         iter_tile_config, load_tileset, random_map_layout, scale_sprite, summarize_tile_sets,
+                         zoom_bucket)
+
+SUBTILE_NAMES = ("center", "corner", "edge", "end_piece", "t_connection", "unconnected")
+# Escapes, brackets inside strings and long top-level numbers, so that small chunk sizes split every kind of token
+STREAM_CHECK_CONFIG = r"""{ "format_version" : 20250117, "tile_info" : [ { "width" : 32, "height" : 32, "pixelscale" : 1.25e0 } ],
+  "tiles-new" : [
+    { "file" : "a \"quoted\" \\ name.png", "tiles" : [ { "id" : "t_caf\u00e9", "fg" : 123456789 },
+      { "id" : [ "t_}", "t_,]" ], "fg" : [ { "weight" : -0.000125, "sprite" : 98765 } ], "rotates" : false } ] },
+    { "file" : "b.png", "sprite_width" : 64, "tiles" : [ ], "note" : "\ud83d\ude00 {[\"x\"]}" } ],
+  "trailing" : [ 1.5E+10, -0, true, null, "" ], "scale" : -2.5E-3 }
+"""
+
+def make_synthetic_config(num_sprites=50000, num_sheets=40, sprite_width=32, sprite_height=32, seed=0):
+    # Build a tile_config-shaped dict plus the sprite ranges parse_config would derive from the sheets
+    rng = random.Random(seed)
+    sprites_per_sheet = num_sprites // num_sheets
+    tile_config = {"tile_info": [{"width": sprite_width, "height": sprite_height}], "tiles-new": []}
+    sprite_ranges = []
+    current_sprite_index = 0
+    for sheet in range(num_sheets):
+        file_name = f"sheet_{sheet:03d}.png"
+        start_index = current_sprite_index
+        end_index = start_index + sprites_per_sheet - 1
+        sprite_ranges.append((file_name, start_index, end_index, sprite_width, sprite_height))
+        current_sprite_index = end_index + 1
+
+        tiles = []
+        for sprite in range(start_index, end_index + 1):
+            tile_ids = f"t_{sheet}_{sprite}"
+            if sprite % 4 == 0:
+                # Every fourth entry uses the list form, several IDs sharing one sprite list
+                tile_ids = [f"t_{sheet}_{sprite}_{variant}" for variant in range(3)]
+            tiles.append({"id": tile_ids, "fg": [sprite, rng.randint(start_index, end_index)]})
+        tile_config["tiles-new"].append({"file": file_name, "tiles": tiles})
+    return tile_config, sprite_ranges
+
+def iter_tile_entries(tile_config):
+    for tile_set in tile_config["tiles-new"]:
+        for tile_entry in tile_set["tiles"]:
+            tile_ids = tile_entry["id"]
+            if not isinstance(tile_ids, list):
+                tile_ids = [tile_ids]
+            yield tile_ids, tile_entry["fg"]
+
+def iter_fg_sprites(tile_config):
+    for _, sprites in iter_tile_entries(tile_config):
+        yield from sprites
+
+def resolve_linear(tile_config, sprite_ranges):
+    # The lookup parse_config used before SpriteRangeIndex: scan every range for every sprite
+    found = 0
+    for global_sprite_index in iter_fg_sprites(tile_config):
+        for file_name, start, end, sprite_width, sprite_height in sprite_ranges:
+            if start <= global_sprite_index <= end:
+                found += 1
+                break
+    return found
+
+def build_range_index(sprite_ranges):
+    index = SpriteRangeIndex()
+    for sprite_range in sprite_ranges:
+        index.append(sprite_range)
+    return index
+
+def resolve_indexed(tile_config, sprite_ranges):
+    index = build_range_index(sprite_ranges)
+    found = 0
+    for global_sprite_index in iter_fg_sprites(tile_config):
+        if index.find(global_sprite_index):
+            found += 1
+    return found
+
+def build_dict_records(tile_config, index):
+    # The tiles_data layout parse_config used before TileTable: one dict per (tile_id, sprite) pair
+    tiles_data = {}
+    for tile_ids, sprites in iter_tile_entries(tile_config):
+        for global_sprite_index in sprites:
+            file_name, _, _, sprite_width, sprite_height = index.find(global_sprite_index)
+            for tile_id in tile_ids:
+                tiles_data.setdefault(tile_id, []).append({
+                    "image": file_name,
+                    "global_sprite_index": global_sprite_index,
+                    "sprite_width": sprite_width,
+                    "sprite_height": sprite_height,
+                    "type": "fg"
+                })
+    return tiles_data
+
+def build_tile_table(tile_config, index):
+    tiles_data = TileTable(index)
+    for tile_ids, sprites in iter_tile_entries(tile_config):
+        tiles_data.add(tile_ids, [(sprite, index.find_position(sprite), LAYER_FG) for sprite in sprites])
+    return tiles_data
+
+def measure_memory(func, *args):
+    # Bytes still allocated by func's result, as seen by tracemalloc
+    tracemalloc.start()
+    result = func(*args)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def bench_sprite_lookup(num_sprites=50000, num_sheets=40):
+    tile_config, sprite_ranges = make_synthetic_config(num_sprites, num_sheets)
+    linear_found, linear_time = time_call(resolve_linear, tile_config, sprite_ranges)
+    indexed_found, indexed_time = time_call(resolve_indexed, tile_config, sprite_ranges)
+    assert linear_found == indexed_found
+    return {
+        "sprites": num_sprites,
+        "sheets": num_sheets,
+        "references": linear_found,
+        "linear_seconds": linear_time,
+        "bisect_seconds": indexed_time,
+        "speedup": linear_time / indexed_time,
+    }
+
+def bench_tile_records(num_sprites=50000, num_sheets=40):
+    tile_config, sprite_ranges = make_synthetic_config(num_sprites, num_sheets)
+    index = build_range_index(sprite_ranges)
+    dict_records, dict_bytes = measure_memory(build_dict_records, tile_config, index)
+    tile_table, table_bytes = measure_memory(build_tile_table, tile_config, index)
+    assert len(dict_records) == len(tile_table)
+    return {
+        "tile_ids": len(tile_table),
+        "dict_bytes": dict_bytes,
+        "tile_table_bytes": table_bytes,
+        "reduction": dict_bytes / table_bytes,
+    }
+
+def write_synthetic_pack(pack_dir, num_sheets=8, sprites_per_sheet=256, sprite_width=32, sprite_height=32,
+                         tiles_per_sheet=200, variants=3, multitile_every=10, seed=0):
+    # Writes sheet PNGs and a tile_config.json shaped like a real pack: plain and weighted fg variants,
+    # bg layers, rotating tiles and multitiles with additional_tiles. Returns the config path.
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    os.makedirs(pack_dir, exist_ok=True)
+    columns = 16
+    rows = -(-sprites_per_sheet // columns)
+    tile_config = {"tile_info": [{"width": sprite_width, "height": sprite_height}], "tiles-new": []}
+    first_sprite = 0
+    for sheet in range(num_sheets):
+        # A flat colour and a random opaque block per sprite: compresses like real art, unlike noise
+        pixels = np.zeros((rows, sprite_height, columns, sprite_width, 4), dtype=np.uint8)
+        pixels[...] = np_rng.integers(0, 256, (rows, 1, columns, 1, 4), dtype=np.uint8)
+        pixels[..., 3] = 160
+        block_y, block_x = sprite_height // 4, sprite_width // 4
+        pixels[:, block_y:3 * block_y, :, block_x:3 * block_x] = np_rng.integers(0, 256, (rows, 1, columns, 1, 4), dtype=np.uint8)
+        pixels[:, block_y:3 * block_y, :, block_x:3 * block_x, 3] = 255
+        file_name = f"sheet_{sheet:03d}.png"
+        Image.fromarray(pixels.reshape(rows * sprite_height, columns * sprite_width, 4), "RGBA").save(os.path.join(pack_dir, file_name))
+
+        def sprite():
+            return first_sprite + rng.randrange(sprites_per_sheet)
+
+        tiles = []
+        for tile in range(tiles_per_sheet):
+            tile_entry = {"id": f"t_s{sheet}_{tile}"}
+            if variants > 1 and tile % 3 == 0:
+                tile_entry["fg"] = [{"weight": rng.randint(1, 10), "sprite": sprite()} for _ in range(variants)]
+            else:
+                tile_entry["fg"] = sprite()
+            if tile % 4 == 0:
+                tile_entry["bg"] = sprite()
+            if tile % 7 == 0:
+                tile_entry["rotates"] = True
+            if multitile_every and tile % multitile_every == 0:
+                tile_entry["multitile"] = True
+                tile_entry["additional_tiles"] = [{"id": sub_name, "fg": [sprite() for _ in range(4)]} for sub_name in SUBTILE_NAMES]
+            tiles.append(tile_entry)
+        tile_config["tiles-new"].append({"file": file_name, "tiles": tiles})
+        first_sprite += rows * columns
+
+    config_path = os.path.join(pack_dir, "tile_config.json")
+    with open(config_path, "w") as f:
+        json.dump(tile_config, f, indent=1)
+    return config_path
+
+def time_repeat(func, *args, repeat=5):
+    # Best of repeat runs, in seconds
+    best = None
+    for _ in range(repeat):
+        _, seconds = time_call(func, *args)
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+def parse_dom(config_path):
+    with open(config_path, "r") as f:
+        tileset = Tileset(json.load(f), os.path.dirname(config_path))
+    tileset.parse()
+    return tileset
+
+def parse_streamed(config_path):
+    tileset = Tileset(None, os.path.dirname(config_path))
+    with open(config_path, "r") as f:
+        tileset.parse_stream(f)
+    return tileset
+
+def bench_parse(config_path):
+    _, dom_seconds = time_call(parse_dom, config_path)
+    tileset, stream_seconds = time_call(parse_streamed, config_path)
+    cache = TilesetCache(config_path)
+    _, save_seconds = time_call(cache.save, tileset)
+    _, load_seconds = time_call(cache.load)
+    _, build_seconds = time_call(tileset.build_indexes)
+    return tileset, {
+        "tile_ids": len(tileset.tiles_data),
+        "sheets": len(tileset.image_sprite_ranges),
+        "dom_seconds": dom_seconds,
+        "stream_seconds": stream_seconds,
+        "cache_save_seconds": save_seconds,
+        "cache_load_seconds": load_seconds,
+        "build_indexes_seconds": build_seconds, # Sorting and indexing behind tree population and search
+    }
+
+def bench_tree(tileset):
+    # Populating the Treeview needs a display; without one only the data side (build_indexes) is measured
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return {"skipped": f"no display: {e}"}
+    from tile_viewer import TileViewerApp
+    try:
+        root.withdraw()
+        app = TileViewerApp(root)
+        app.parse_config(tileset)
+        _, populate_seconds = time_call(app.populate_treeview)
+        start = time.perf_counter()
+        for file_node in list(app.file_nodes.values()):
+            tile_ids = app.pending_tree_children.pop(file_node)
+            app.tree.delete(*app.tree.get_children(file_node))
+            app.node_items[file_node] = {}
+            app.insert_tree_chunk(file_node, tile_ids, 0, app.node_generation[file_node])
+        root.update() # Runs the chunked inserts scheduled with after()
+        while any(len(items) < len(app.node_tile_ids[file_node]) for file_node, items in app.node_items.items()):
+            root.update()
+        expand_seconds = time.perf_counter() - start
+        return {"populate_seconds": populate_seconds, "expand_all_seconds": expand_seconds}
+    finally:
+        root.destroy()
+
+def bench_search(tileset, terms=("s1_", "t_s", "^t_s2", "edge", "1_1")):
+    index = tileset.search_index
+    results = {}
+    for term in terms:
+        positions = index.search(term)
+        results[term] = {"seconds": time_repeat(index.search, term), "results": len(positions)}
+
+    # Search-as-you-type: every keystroke narrows the previous result
+    def type_term(term):
+        previous = None
+        for length in range(1, len(term) + 1):
+            previous = (term[:length], index.search(term[:length], previous))
+        return previous
+    results["typing 't_s1_1'"] = {"seconds": time_repeat(type_term, "t_s1_1")}
+    return results
+
+def bench_display(tileset, zoom_levels=(0.5, 1.0, 2.0, 3.5), sample=500, seed=0):
+    # The work display_tile does per variant, minus the Tk canvas: composite bg under fg, then scale
+    rng = random.Random(seed)
+    tile_ids = rng.sample(sorted(tileset.tiles_data.slices), min(sample, len(tileset.tiles_data)))
+    renderer = TileRenderer(tileset, SheetCache())
+    variants = [(tile_id, variant) for tile_id in tile_ids for variant in range(len(renderer.variants(tile_id)))]
+
+    def composite_all():
+        for tile_id, variant in variants:
+            renderer.composite(tile_id, variant)
+    _, cold_seconds = time_call(composite_all) # Decodes every sheet once
+    renderer.clear()
+    _, warm_seconds = time_call(composite_all) # Sheets cached, composites not
+
+    results = {"variants": len(variants), "composite_cold_seconds": cold_seconds, "composite_warm_seconds": warm_seconds}
+    arrays = [renderer.composite(tile_id, variant) for tile_id, variant in variants]
+    for zoom_level in zoom_levels:
+        def scale_all():
+            for composited in arrays:
+                if composited is not None:
+                    scale_sprite(composited, zoom_bucket(zoom_level))
+        results[f"scale_zoom_{zoom_level}_seconds"] = time_repeat(scale_all, repeat=3)
+
+    # Contact sheet of the first sheet, one 1280x800 viewport per zoom
+    file_name, start_index, _, sprite_width, sprite_height = tileset.image_sprite_ranges.ranges[0]
+    atlas = renderer.sheet_cache.get(os.path.join(tileset.base_dir, file_name), sprite_width, sprite_height)
+    for zoom_level in zoom_levels:
+        contact_sheet = ContactSheet(atlas, start_index, tileset.ids_by_sprite, zoom_bucket(zoom_level))
+        results[f"contact_sheet_zoom_{zoom_level}_seconds"] = time_repeat(contact_sheet.render, 0, 0, 1280, 800, repeat=3)
+    return results
+
+def bench_map_preview(tileset, size=200, viewport=(1280, 800), frames=120):
+    renderer = TileRenderer(tileset, SheetCache())
+    names, codes = random_map_layout(tileset, size, size, np.random.default_rng(0))
+    preview, build_seconds = time_call(MapPreview, tileset, renderer, names, codes)
+    width, height = viewport
+    full_seconds = time_repeat(preview.render_region, 0, 0, width, height)
+
+    preview.render(0, 0, width, height)
+    start = time.perf_counter()
+    for frame in range(1, frames + 1):
+        preview.render(min(frame * 8, max(preview.width - width, 0)), min(frame * 4, max(preview.height - height, 0)), width, height)
+    pan_seconds = (time.perf_counter() - start) / frames
+    return {"cells": size * size, "stamps": len(preview.stamps), "build_seconds": build_seconds,
+            "full_frame_seconds": full_seconds, "pan_frame_seconds": pan_seconds}
+
+def bench_export(config_path, output_dir, jobs):
+    args = argparse.Namespace(config=config_path, output_dir=output_dir, filter=None, jobs=jobs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, seconds = time_call(export_command, args)
+    images = len(os.listdir(output_dir))
+    return {"jobs": jobs, "images": images, "seconds": seconds, "images_per_second": images / seconds}
+
+def tileset_contents(tileset):
+    # What parsing leaves in a Tileset, in a form that compares equal however it was built
+    return {
+        "ranges": list(tileset.image_sprite_ranges),
+        "tiles": {tile_id: [(record.image, record.global_sprite_index, record.sprite_width, record.sprite_height,
+                             record.type, record.variant, record.weight) for record in records]
+                  for tile_id, records in tileset.tiles_data.items()},
+        "rotating": tileset.tiles_data.rotating,
+        "variant_tables": {tile_id: (table.group_list, table.weights) for tile_id, table in tileset.tiles_data.variant_tables.items()},
+        "looks_like": tileset.tile_graph.looks_like,
+        "subtiles": tileset.tile_graph.subtiles,
+        "ids_by_sprite": {index: sorted(tile_ids) for index, tile_ids in tileset.ids_by_sprite.items()},
+        "sorted_tiles_by_file": list(tileset.sorted_tiles_by_file.items()),
+    }
+
+def check_stream(config_path, chunk_sizes=(1, 2, 3, 7, 64, 4096)):
+    # iter_tile_config must rebuild exactly what json.loads reads, wherever the chunk boundaries fall
+    with open(config_path, "r") as f:
+        pack_text = f.read()
+    # The synthetic pack skips the smallest chunk sizes to keep the run short; STREAM_CHECK_CONFIG covers them
+    for text, sizes in ((STREAM_CHECK_CONFIG, chunk_sizes), (pack_text, chunk_sizes[3:])):
+        expected = json.loads(text)
+        for chunk_size in sizes:
+            rebuilt = {}
+            for key, value in iter_tile_config(JsonStreamReader(io.StringIO(text), chunk_size)):
+                if key == "tiles-new":
+                    rebuilt.setdefault(key, []).append(value)
+                else:
+                    rebuilt[key] = value
+            assert rebuilt == expected, f"streamed config differs from json.loads at chunk size {chunk_size}"
+    assert tileset_contents(parse_streamed(config_path)) == tileset_contents(parse_dom(config_path)), \
+        "parse_stream differs from parse"
+    return {"chunk_sizes": list(chunk_sizes)}
+
+def check_cache(config_path, tileset):
+    cache = TilesetCache(config_path)
+    cache.save(tileset)
+    loaded = cache.load()
+    assert loaded is not None, "TilesetCache.load rejected the file it just saved"
+    assert tileset_contents(loaded) == tileset_contents(tileset), "TilesetCache round trip changed the tileset"
+    return {"tile_ids": len(loaded.tiles_data)}
+
+def check_search(tileset, terms=("t_s1_1", "^t_s2_1", "edge", "S1_1:C", "zzz")):
+    # Narrowing the previous result while typing (and re-searching after backspace) must match a fresh search
+    index = tileset.search_index
+    queries = 0
+    for term in terms:
+        term = term.lower()
+        typed = [term[:length] for length in range(1, len(term) + 1)]
+        previous = None
+        for prefix in typed + typed[-2::-1]:
+            positions = index.search(prefix, previous)
+            assert positions == index.search(prefix), f"narrowed search for {prefix!r} differs from a fresh one"
+            previous = (prefix, positions)
+            queries += 1
+    return {"queries": queries}
+
+def check_reload(config_path, work_dir):
+    # Re-parsing only the edited tile sets in place must give what a fresh parse of the edited config gives
+    pack_dir = os.path.join(work_dir, "reload_pack")
+    shutil.copytree(os.path.dirname(config_path), pack_dir)
+    config_path = os.path.join(pack_dir, os.path.basename(config_path))
+    tileset = parse_streamed(config_path)
+    tileset.config_path = config_path
+    _, summaries, _ = summarize_tile_sets(config_path)
+
+    with open(config_path, "r") as f:
+        tile_config = json.load(f)
+    edited_tiles = tile_config["tiles-new"][min(1, len(tile_config["tiles-new"]) - 1)]["tiles"]
+    edited_tiles[0]["fg"] = edited_tiles[-1]["fg"] # Changed sprites
+    del edited_tiles[1] # Removed tile
+    edited_tiles.append({"id": "t_added", "fg": edited_tiles[0]["fg"], "rotates": True}) # New tiles
+    edited_tiles.append({"id": "t_added_alias", "looks_like": "t_added"})
+    with open(config_path, "w") as f:
+        json.dump(tile_config, f, indent=1)
+
+    _, new_summaries, edited = summarize_tile_sets(config_path, summaries)
+    tile_ids = TilesetWatcher(tileset).edited_tile_ids(summaries, new_summaries, edited)
+    assert tile_ids is not None, "the edit should be reloadable in place"
+    tileset.replace_tile_sets(tile_ids, [edited[position] for position in sorted(edited)])
+    assert tileset_contents(tileset) == tileset_contents(parse_streamed(config_path)), \
+        "in-place reload differs from a fresh parse"
+    return {"tile_sets": len(edited), "tile_ids": len(tile_ids)}
+
+def check_map_pan(tileset, viewport=(300, 200), moves=((13, 0), (0, 7), (-5, -9), (40, 33), (0, 0), (-299, 0), (301, 5), (-7, 199))):
+    # Incrementally panned frames must match drawing the whole region again
+    renderer = TileRenderer(tileset, SheetCache())
+    names, codes = random_map_layout(tileset, 60, 40, np.random.default_rng(0))
+    preview = MapPreview(tileset, renderer, names, codes, np.random.default_rng(0))
+    width, height = viewport
+    frames = 0
+    for zoom_level in (1.0, 1.5, 0.5):
+        preview.set_zoom(zoom_level)
+        x = y = 0
+        for dx, dy in moves:
+            x, y = max(x + dx, 0), max(y + dy, 0)
+            frame = preview.render(x, y, width, height)
+            assert np.array_equal(frame, preview.render_region(x, y, width, height)), \
+                f"panned frame at ({x}, {y}), zoom {zoom_level} differs from a full redraw"
+            frames += 1
+    return {"frames": frames}
+
+def run_checks(args, work_dir):
+    # Fast paths against the plain way of getting the same result; a failed check raises AssertionError
+    config_path = write_synthetic_pack(os.path.join(work_dir, "pack"), args.sheets, args.sprites_per_sheet,
+                                       args.sprite_size, args.sprite_size, args.tiles_per_sheet, args.variants,
+                                       args.multitile_every, args.seed)
+    tileset = parse_streamed(config_path)
+    return {
+        "stream": check_stream(config_path),
+        "cache": check_cache(config_path, tileset),
+        "search": check_search(tileset),
+        "reload": check_reload(config_path, work_dir),
+        "map_pan": check_map_pan(tileset),
+    }
+
+def run_suite(args, work_dir):
+    config_path = write_synthetic_pack(os.path.join(work_dir, "pack"), args.sheets, args.sprites_per_sheet,
+                                       args.sprite_size, args.sprite_size, args.tiles_per_sheet, args.variants,
+                                       args.multitile_every, args.seed)
+    tileset, parse_results = bench_parse(config_path)
+    load_tileset(config_path) # Warm the compiled cache the export workers read
+    return {
+        "parse": parse_results,
+        "tree": bench_tree(tileset),
+        "search": bench_search(tileset),
+        "display": bench_display(tileset),
+        "map_preview": bench_map_preview(tileset),
+        "export": bench_export(config_path, os.path.join(work_dir, "export"), args.jobs),
+        "sprite_lookup": bench_sprite_lookup(),
+        "tile_records": bench_tile_records(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time loading, searching and rendering a synthetic pack; prints JSON.")
+    parser.add_argument("--sheets", type=int, default=8)
+    parser.add_argument("--sprites-per-sheet", type=int, default=256)
+    parser.add_argument("--sprite-size", type=int, default=32, help="sprite width and height in pixels")
+    parser.add_argument("--tiles-per-sheet", type=int, default=200)
+    parser.add_argument("--variants", type=int, default=3, help="weighted fg variants of every third tile")
+    parser.add_argument("--multitile-every", type=int, default=10, help="every Nth tile gets additional_tiles (0: none)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="export worker processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--keep", help="generate the pack in this directory and keep it")
+    parser.add_argument("--check", action="store_true",
+                        help="check streaming, the compiled cache, search, in-place reload and map panning against "
+                             "their slow equivalents instead of timing")
+    args = parser.parse_args(argv)
+
+    work_dir = args.keep or tempfile.mkdtemp(prefix="tile_viewer_bench_")
+    # Keep the compiled-cache and sheet-size files of the synthetic pack out of the user's cache dir
+    os.environ["XDG_CACHE_HOME"] = os.environ["LOCALAPPDATA"] = os.path.join(work_dir, "cache")
+    try:
+        results = run_checks(args, work_dir) if args.check else run_suite(args, work_dir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "parameters": {name: value for name, value in vars(args).items() if name not in ("output", "keep", "check")},
+        "environment": {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
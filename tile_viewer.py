@@ -2,26 +2,265 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
 from tkinter import ttk
 import json
-from PIL import Image, ImageTk
+from PIL import Image, ImageDraw, ImageTk
+import numpy as np
 import os
+import argparse
+import cProfile
+import hashlib
+import io
+import multiprocessing
+import re
+import time
+import random
+import queue
+import struct
+import sys
+from array import array
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left, bisect_right
+
+SHEET_CACHE_BUDGET = 512 * 1024 * 1024 # Default memory budget for decoded sprite sheets, in bytes
+TREE_CHUNK_SIZE = 500 # Tile IDs inserted into the tree per after() callback
+LOAD_POLL_MS = 50 # How often the Tk thread checks the background loader for progress
+PROBE_WORKERS = 8 # Threads used to read sheet dimensions in parallel
+STREAM_CHUNK_SIZE = 1024 * 1024 # Characters of tile_config.json read at a time by the streaming parser
+SNAPSHOT_SHARE = 0.1 # Largest share of a streamed load spent copying snapshots for the Tk thread to draw from
+SEARCH_DEBOUNCE_MS = 150 # Delay after the last keystroke before search-as-you-type runs
+SCALED_CACHE_SIZE = 2048 # Maximum number of scaled sprites / PhotoImages kept alive
+ZOOM_BUCKETS_PER_UNIT = 20 # Zoom is snapped to steps of 1/20 so slider drags reuse cached scales
+MAP_PREVIEW_SIZE = 200 # Default width and height of a random preview map, in cells
+FRAME_TIME_SAMPLES = 60 # Frames averaged in the map preview's frame-time readout
+WATCH_INTERVAL = 0.25 # Seconds between checks for edited sheets / config while auto reload is on
+PERF_SAMPLES = 500 # Most recent timings kept per hot path for the percentiles
+PERF_REFRESH_MS = 500 # How often the timings bar updates while shown
+
+class PerfStats:
+    # Rolling timings of the hot paths and hit rates of the caches, shown by the timings bar and --perf-log.
+    # Recording is a perf_counter() pair and a deque append, cheap enough to always leave on.
+    def __init__(self, samples=PERF_SAMPLES):
+        self.samples = samples
+        self.timings = {} # name -> deque of the last samples durations, in seconds
+        self.counts = {} # name -> number of timings recorded in total
+        self.cache_sources = {} # name -> callable returning a stats() dict with hits and misses
+
+    def record(self, name, seconds):
+        timings = self.timings.get(name)
+        if timings is None:
+            timings = self.timings.setdefault(name, deque(maxlen=self.samples))
+        timings.append(seconds)
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def add_cache(self, name, stats):
+        self.cache_sources[name] = stats
+
+    def percentiles(self, name):
+        values = np.fromiter(self.timings[name].copy(), dtype=np.float64) * 1000 # deque.copy() is safe against other threads
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        return {"count": self.counts[name], "window": len(values),
+                "p50_ms": p50, "p90_ms": p90, "p99_ms": p99, "max_ms": values.max()}
+
+    def cache_rates(self):
+        rates = {}
+        for name, stats in self.cache_sources.items():
+            values = stats()
+            lookups = values["hits"] + values["misses"]
+            rates[name] = dict(values, hit_rate=values["hits"] / lookups if lookups else None)
+        return rates
+
+    def report(self):
+        return {"timings": {name: self.percentiles(name) for name in list(self.timings)}, "caches": self.cache_rates()}
+
+    def summary(self):
+        # Short text for the timings bar
+        report = self.report()
+        timings = [f"{name} {values['p50_ms']:.1f}/{values['p90_ms']:.1f}/{values['p99_ms']:.1f}"
+                   for name, values in report["timings"].items()]
+        caches = [f"{name} {values['hit_rate']:.0%}" for name, values in report["caches"].items() if values["hit_rate"] is not None]
+        lines = ["p50/p90/p99 ms: " + (", ".join(timings) or "nothing timed yet")]
+        if caches:
+            lines.append("cache hits: " + ", ".join(caches))
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def clear(self):
+        self.timings = {}
+        self.counts = {}
+
+perf_stats = PerfStats() # Shared by the viewer, its loader threads and the export command
+
+def zoom_bucket(zoom_level):
+    return max(1, round(zoom_level * ZOOM_BUCKETS_PER_UNIT)) / ZOOM_BUCKETS_PER_UNIT
+
+def scale_sprite(sprite_array, zoom_level):
+    # Nearest-neighbour scale of an RGBA sprite array to a PIL image
+    if zoom_level == 1.0:
+        return Image.fromarray(sprite_array, "RGBA")
+    if zoom_level == int(zoom_level):
+        # Integer zoom: repeating pixels is exact and cheaper than PIL's generic resampler
+        factor = int(zoom_level)
+        scaled = np.repeat(np.repeat(sprite_array, factor, axis=0), factor, axis=1)
+        return Image.fromarray(scaled, "RGBA")
+    sprite_img = Image.fromarray(sprite_array, "RGBA")
+    new_width = max(1, int(sprite_img.width * zoom_level))
+    new_height = max(1, int(sprite_img.height * zoom_level))
+    return sprite_img.resize((new_width, new_height), Image.Resampling.NEAREST) # Use NEAREST for pixel art
+
+
+class SpriteAtlas:
+    # A decoded sheet sliced into one (n_sprites, sprite_height, sprite_width, 4) array.
+    # Sprites are numbered row by row from 0, matching global_sprite_index - start_index.
+    def __init__(self, sheet_array, sprite_width, sprite_height):
+        self.sprite_width = sprite_width
+        self.sprite_height = sprite_height
+        self.rows = sheet_array.shape[0] // sprite_height
+        self.columns = sheet_array.shape[1] // sprite_width
+
+        # Drop partial sprites at the right/bottom edges, then regroup the grid in one copy
+        grid = sheet_array[:self.rows * sprite_height, :self.columns * sprite_width]
+        grid = grid.reshape(self.rows, sprite_height, self.columns, sprite_width, 4)
+        self.sprites = np.ascontiguousarray(grid.transpose(0, 2, 1, 3, 4)).reshape(
+            self.rows * self.columns, sprite_height, sprite_width, 4)
+        self.digests = [None] * len(self) # Content hash per sprite, each computed on first use
+
+    @classmethod
+    def from_image(cls, img, sprite_width, sprite_height):
+        return cls(np.asarray(img.convert("RGBA")), sprite_width, sprite_height)
+
+    def __len__(self):
+        return self.sprites.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.sprites.nbytes
+
+    def sprite(self, local_sprite_index):
+        # Zero-copy view into the atlas; callers must not write to it
+        return self.sprites[local_sprite_index]
+
+    def sprite_digest(self, local_sprite_index):
+        # blake2b of one sprite's pixels, hashed straight from the atlas the first time it is asked for
+        digest = self.digests[local_sprite_index]
+        if digest is None:
+            digest = hashlib.blake2b(self.sprites[local_sprite_index], digest_size=16).digest()
+            self.digests[local_sprite_index] = digest
+        return digest
+
+    def sprite_digests(self):
+        # Digests of every sprite, for the sprite report: one pass over the contiguous atlas, no per-sprite copies
+        with perf_stats.timer("sprite hash"):
+            rows = self.sprites.reshape(len(self), -1)
+            for local_sprite_index, digest in enumerate(self.digests):
+                if digest is None:
+                    self.digests[local_sprite_index] = hashlib.blake2b(rows[local_sprite_index], digest_size=16).digest()
+        return self.digests
+
+    def sprite_key(self, local_sprite_index):
+        # Equal for pixel-identical sprites, whichever sheet or index they come from
+        return (self.sprite_width, self.sprite_height, self.sprite_digest(local_sprite_index))
+
+    def duplicate_groups(self):
+        # Lists of local indices sharing identical pixels, in index order
+        groups = {}
+        for local_sprite_index, digest in enumerate(self.sprite_digests()):
+            groups.setdefault(digest, []).append(local_sprite_index)
+        return [group for group in groups.values() if len(group) > 1]
+
+class SheetCache:
+    # LRU cache of sprite sheets decoded into SpriteAtlas objects, kept alive across display_tile calls
+    def __init__(self, max_bytes=SHEET_CACHE_BUDGET):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.sheets = OrderedDict() # (image_path, mtime, sprite_width, sprite_height) -> (atlas, size_in_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, image_path, sprite_width, sprite_height):
+        # Raises FileNotFoundError / PIL errors to the caller, like Image.open would
+        mtime = os.path.getmtime(image_path)
+        key = (image_path, mtime, sprite_width, sprite_height)
+        entry = self.sheets.get(key)
+        if entry is not None:
+            self.sheets.move_to_end(key) # Mark as most recently used
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        # Timed separately so a slow first click can be told apart: disk or PNG decode
+        with perf_stats.timer("sheet read"):
+            with open(image_path, "rb") as f:
+                data = f.read()
+        with perf_stats.timer("sheet decode"):
+            with Image.open(io.BytesIO(data)) as img:
+                atlas = SpriteAtlas.from_image(img, sprite_width, sprite_height)
+        size = atlas.nbytes
+        self.sheets[key] = (atlas, size)
+        self.current_bytes += size
+        self.evict()
+        return atlas
+
+    def evict(self):
+        # Drop least recently used sheets until we are under budget, but always keep the newest one
+        while self.current_bytes > self.max_bytes and len(self.sheets) > 1:
+            _, (_, size) = self.sheets.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def discard(self, image_path):
+        # Drop every decoded copy of image_path, e.g. after the file was edited
+        for key in [key for key in self.sheets if key[0] == image_path]:
+            _, size = self.sheets.pop(key)
+            self.current_bytes -= size
+
+    def clear(self):
+        self.sheets.clear()
+        self.current_bytes = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "sheets": len(self.sheets),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
 
 class GraphicsPackSelectionDialog(tk.Toplevel):
-    def __init__(self, parent, graphics_packs):
+    # With multiple=True, several packs can be picked and the result is a list of names
+    def __init__(self, parent, graphics_packs, multiple=False):
         super().__init__(parent)
-        self.title("Select Graphics Pack")
+        self.title("Select Graphics Packs" if multiple else "Select Graphics Pack")
         self.transient(parent)
         self.grab_set()
 
         self.result = None
+        self.multiple = multiple
 
-        label = tk.Label(self, text="Select a graphics pack:")
+        label = tk.Label(self, text="Select graphics packs to compare:" if multiple else "Select a graphics pack:")
         label.pack(pady=10)
 
         # Frame for listbox and scrollbar
         self.list_frame = tk.Frame(self)
         self.list_frame.pack(pady=5, padx=10, fill=tk.BOTH, expand=True)
 
-        self.listbox = tk.Listbox(self.list_frame)
+        self.listbox = tk.Listbox(self.list_frame, selectmode=tk.EXTENDED if multiple else tk.BROWSE)
         for pack in graphics_packs:
             self.listbox.insert(tk.END, pack)
         self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -52,8 +291,13 @@ class GraphicsPackSelectionDialog(tk.Toplevel):
 
     def on_select_button(self):
         selected_index = self.listbox.curselection()
-        if selected_index:
-            self.result = self.listbox.get(selected_index[0])
+        if self.multiple and len(selected_index) < 2:
+            messagebox.showinfo("Info", "Please select at least two graphics packs.")
+        elif selected_index:
+            if self.multiple:
+                self.result = [self.listbox.get(index) for index in selected_index]
+            else:
+                self.result = self.listbox.get(selected_index[0])
             self.destroy()
         else:
             messagebox.showinfo("Info", "Please select a graphics pack.")
@@ -65,20 +309,2072 @@ class GraphicsPackSelectionDialog(tk.Toplevel):
     def show(self):
         self.wait_window()
         return self.result
+class ScaledSpriteCache:
+    # LRU cache of (scaled image, PhotoImage) pairs keyed by (sprite_key, zoom bucket)
+    def __init__(self, max_entries=SCALED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sprite_key, sprite_array, zoom_level):
+        key = (sprite_key, zoom_level)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        with perf_stats.timer("scale"):
+            scaled_sprite_img = scale_sprite(sprite_array, zoom_level)
+        with perf_stats.timer("photoimage"):
+            photo_img = ImageTk.PhotoImage(scaled_sprite_img)
+        entry = (scaled_sprite_img, photo_img)
+        self.entries[key] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+class TileSearchIndex:
+    # Lowercased tile IDs in a sorted array (for prefix queries) plus a trigram inverted index (for substring queries).
+    # Results are lists of positions into the sorted array, so they come back in sorted order.
+    def __init__(self, tiles_by_file):
+        files_by_tile = {}
+        for file_name, tile_ids in tiles_by_file.items():
+            for tile_id in tile_ids:
+                files_by_tile.setdefault(tile_id, []).append(file_name)
+
+        entries = sorted((tile_id.lower(), tile_id) for tile_id in files_by_tile)
+        self.lower_ids = [lower_id for lower_id, _ in entries]
+        self.tile_ids = [tile_id for _, tile_id in entries]
+        self.files = [files_by_tile[tile_id] for tile_id in self.tile_ids]
+
+        self.trigrams = {} # trigram -> ascending positions of IDs containing it
+        self.short_positions = [] # IDs too short to have a trigram
+        for position, lower_id in enumerate(self.lower_ids):
+            if len(lower_id) < 3:
+                self.short_positions.append(position)
+                continue
+            for trigram in {lower_id[i:i + 3] for i in range(len(lower_id) - 2)}:
+                self.trigrams.setdefault(trigram, []).append(position)
+
+    def prefix(self, prefix):
+        start = bisect_left(self.lower_ids, prefix)
+        end = bisect_left(self.lower_ids, prefix + "\uffff")
+        return list(range(start, end))
+
+    def substring(self, term):
+        if not term:
+            return list(range(len(self.lower_ids)))
+        if len(term) >= 3:
+            # Every trigram of the term must be present; verify candidates from the rarest one
+            postings = [self.trigrams.get(term[i:i + 3]) for i in range(len(term) - 2)]
+            if not all(postings):
+                return []
+            candidates = min(postings, key=len)
+        else:
+            # A 1-2 character term lies inside some trigram of every long ID that contains it
+            candidate_set = set(self.short_positions)
+            for trigram, positions in self.trigrams.items():
+                if term in trigram:
+                    candidate_set.update(positions)
+            candidates = sorted(candidate_set)
+        return [position for position in candidates if term in self.lower_ids[position]]
+
+    def search(self, search_term, previous=None):
+        # search_term is lowercased; a leading "^" anchors it to the start of the ID.
+        # previous is the (search_term, positions) of the last query, reused when the new term only narrows it.
+        anchored = search_term.startswith("^")
+        term = search_term[1:] if anchored else search_term
+        if previous is not None:
+            previous_term, previous_positions = previous
+            previous_anchored = previous_term.startswith("^")
+            previous_core = previous_term[1:] if previous_anchored else previous_term
+            if anchored and previous_anchored and term.startswith(previous_core):
+                return [p for p in previous_positions if self.lower_ids[p].startswith(term)]
+            if not anchored and not previous_anchored and previous_core in term:
+                return [p for p in previous_positions if term in self.lower_ids[p]]
+        if anchored:
+            return self.prefix(term)
+        return self.substring(term)
+
+    def group_by_file(self, positions, file_order):
+        # Turn result positions into file_name -> sorted tile ID list, in file_order
+        grouped = {file_name: [] for file_name in file_order}
+        for position in positions:
+            tile_id = self.tile_ids[position]
+            for file_name in self.files[position]:
+                grouped[file_name].append(tile_id)
+        return {file_name: tile_ids for file_name, tile_ids in grouped.items() if tile_ids}
+
+class SpriteRangeIndex:
+    # Maps global sprite indices to the sheet that holds them.
+    # Ranges are appended in config order, so start offsets are already sorted and can be bisected.
+    def __init__(self):
+        self.ranges = [] # (file_name, start_index, end_index, sprite_width, sprite_height)
+        self.starts = [] # start_index of each range, parallel to self.ranges
+        self.ranges_by_file = {} # file_name -> range tuple
+
+    def append(self, sprite_range):
+        self.ranges.append(sprite_range)
+        self.starts.append(sprite_range[1])
+        file_name = sprite_range[0]
+        if file_name not in self.ranges_by_file:
+            self.ranges_by_file[file_name] = sprite_range
+
+    def next_index(self):
+        # Global sprite index the next appended range starts at
+        return self.ranges[-1][2] + 1 if self.ranges else 0
+
+    def find_position(self, global_sprite_index):
+        # Returns the position (sheet id) of the range containing global_sprite_index, or -1
+        position = bisect_right(self.starts, global_sprite_index) - 1
+        if position >= 0 and global_sprite_index <= self.ranges[position][2]:
+            return position
+        return -1
+
+    def find(self, global_sprite_index):
+        # Returns the range tuple containing global_sprite_index, or None
+        position = self.find_position(global_sprite_index)
+        if position < 0:
+            return None
+        return self.ranges[position]
+
+    def for_file(self, file_name):
+        return self.ranges_by_file.get(file_name)
+
+    def __iter__(self):
+        return iter(self.ranges)
+
+    def __len__(self):
+        return len(self.ranges)
+
+LAYER_FG = 0
+LAYER_BG = 1
+LAYER_NAMES = ("fg", "bg") # Indexed by the layer column of TileTable
+WEIGHT_MAX = 2 ** 31 - 1 # Largest weight TileTable's int column can hold
+
+class SpriteRecord:
+    # View of one sprite of a tile, materialized from TileTable's columns
+    __slots__ = ("image", "global_sprite_index", "sprite_width", "sprite_height", "type", "variant", "weight")
+
+    def __init__(self, image, global_sprite_index, sprite_width, sprite_height, sprite_type, variant=0, weight=1):
+        self.image = image
+        self.global_sprite_index = global_sprite_index
+        self.sprite_width = sprite_width
+        self.sprite_height = sprite_height
+        self.type = sprite_type
+        self.variant = variant # Index of the weighted variant group within its layer
+        self.weight = weight # Weight of that group
+
+class VariantTable:
+    # Cumulative weights of a tile's weighted variant groups, so a random pick is a bisect.
+    # Picks return the variant group number stored in TileTable.variants.
+    def __init__(self, groups, weights):
+        if not any(weights):
+            weights = [1] * len(weights) # All-zero weights: treat the variants as equally likely
+        self.groups = np.asarray(groups, dtype=np.int64)
+        self.group_list = list(groups)
+        self.weights = list(weights)
+        self.cumulative = np.cumsum(np.asarray(weights, dtype=np.int64))
+        self.cumulative_list = self.cumulative.tolist()
+        self.total = self.cumulative_list[-1]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def sample(self, rng=random):
+        return self.group_list[bisect_right(self.cumulative_list, rng.random() * self.total)]
+
+    def sample_many(self, count, rng=None):
+        # Variant group for each of count cells in one vectorized searchsorted
+        rng = rng or np.random.default_rng()
+        return self.groups[np.searchsorted(self.cumulative, rng.random(count) * self.total, side="right")]
+
+class TileTable:
+    # Array-backed replacement for a {tile_id: [sprite dict, ...]} mapping.
+    # Sprites live in parallel columns; each tile ID maps to a (start, end) slice of them, and the IDs of one
+    # config entry (the "id": [...] form) share the same slice. Sheet details come from the SpriteRangeIndex.
+    def __init__(self, sheets):
+        self.sheets = sheets # SpriteRangeIndex; a sheet id is a position in sheets.ranges
+        self.sprite_indices = array("i") # Global sprite index
+        self.sheet_ids = array("i")
+        self.layers = array("b") # Index into LAYER_NAMES
+        self.variants = array("h") # Weighted variant group within the tile's layer
+        self.weights = array("i") # Weight of that variant group
+        self.slices = {} # tile_id -> (start, end) into the columns
+        self.rotating = set() # Tile IDs whose entry has "rotates": true
+        self.definitions = {} # tile_id -> config position of the entry defining it, while parsing
+        self.variant_tables = {} # tile_id -> VariantTable of its fg groups, for tiles with more than one
+
+    def append_sprite(self, global_sprite_index, sheet_id, layer, variant=0, weight=1):
+        self.sprite_indices.append(global_sprite_index)
+        self.sheet_ids.append(sheet_id)
+        self.layers.append(layer)
+        self.variants.append(variant)
+        self.weights.append(weight)
+
+    def add(self, tile_ids, sprites, rotates=False):
+        # sprites is a list of (global_sprite_index, sheet_id, layer, variant, weight)
+        if not sprites:
+            return
+        start = len(self.sprite_indices)
+        for sprite in sprites:
+            self.append_sprite(*sprite)
+        span = (start, len(self.sprite_indices))
+
+        for tile_id in tile_ids:
+            if rotates:
+                self.rotating.add(tile_id)
+            self.slices[tile_id] = span
+
+    def claim(self, tile_ids, definition):
+        # The IDs of tile_ids that the entry at config position definition gets to define. As in game, the first
+        # definition of an ID wins; an entry parsed late because it was deferred can still take an ID back.
+        claimed = []
+        for tile_id in tile_ids:
+            current = self.definitions.get(tile_id)
+            if current is not None and current <= definition:
+                continue
+            if current is not None:
+                self.slices.pop(tile_id, None)
+                self.rotating.discard(tile_id)
+            self.definitions[tile_id] = definition
+            claimed.append(tile_id)
+        return claimed
+
+    def build_variant_tables(self):
+        # Precompute cumulative weights once per distinct slice with more than one fg group
+        tables_by_span = {}
+        self.variant_tables = {}
+        for tile_id, span in self.slices.items():
+            if span not in tables_by_span:
+                group_weights = {}
+                for position in range(*span):
+                    if self.layers[position] == LAYER_FG:
+                        group_weights.setdefault(self.variants[position], self.weights[position])
+                tables_by_span[span] = None
+                if len(group_weights) > 1:
+                    groups = sorted(group_weights)
+                    tables_by_span[span] = VariantTable(groups, [group_weights[group] for group in groups])
+            if tables_by_span[span] is not None:
+                self.variant_tables[tile_id] = tables_by_span[span]
+
+    def record(self, position):
+        file_name, _, _, sprite_width, sprite_height = self.sheets.ranges[self.sheet_ids[position]]
+        return SpriteRecord(file_name, self.sprite_indices[position], sprite_width, sprite_height,
+                            LAYER_NAMES[self.layers[position]], self.variants[position], self.weights[position])
+
+    def get(self, tile_id, default=None):
+        span = self.slices.get(tile_id)
+        if span is None:
+            return default
+        return [self.record(position) for position in range(*span)]
+
+    def __getitem__(self, tile_id):
+        return [self.record(position) for position in range(*self.slices[tile_id])]
+
+    def __contains__(self, tile_id):
+        return tile_id in self.slices
+
+    def __iter__(self):
+        return iter(self.slices)
+
+    def __len__(self):
+        return len(self.slices)
+
+    def items(self):
+        for tile_id in self.slices:
+            yield tile_id, self[tile_id]
+
+ROTATION_LABELS = ("0°", "90°", "180°", "270°")
+
+def alpha_composite(bottom, top):
+    # Porter-Duff "over" of two equally sized straight-alpha RGBA uint8 arrays, done on the whole array at once
+    top = top.astype(np.float32) / 255.0
+    bottom = bottom.astype(np.float32) / 255.0
+    top_alpha = top[..., 3:4]
+    bottom_alpha = bottom[..., 3:4] * (1.0 - top_alpha)
+    out_alpha = top_alpha + bottom_alpha
+    out_rgb = top[..., :3] * top_alpha + bottom[..., :3] * bottom_alpha
+    np.divide(out_rgb, out_alpha, out=out_rgb, where=out_alpha > 0)
+    out = np.concatenate([out_rgb, out_alpha], axis=-1)
+    return (out * 255.0 + 0.5).astype(np.uint8)
+
+def place_bottom_center(sprite_array, height, width):
+    # Pad a sprite onto a transparent height x width canvas, bottom-aligned and horizontally centred,
+    # which is how taller / wider sprites sit over a standard tile in game
+    if sprite_array.shape[:2] == (height, width):
+        return sprite_array
+    canvas = np.zeros((height, width, 4), dtype=np.uint8)
+    sprite_height, sprite_width = sprite_array.shape[:2]
+    x = (width - sprite_width) // 2
+    canvas[height - sprite_height:, x:x + sprite_width] = sprite_array
+    return canvas
+
+def group_variants(sprites):
+    # [(weight, [SpriteRecord, ...]), ...] ordered by variant group
+    groups = {}
+    for sprite_info in sprites:
+        groups.setdefault(sprite_info.variant, (sprite_info.weight, []))[1].append(sprite_info)
+    return [groups[variant] for variant in sorted(groups)]
+
+class TileRenderer:
+    # Composites a tile's bg sprite under its fg sprite, one image per variant.
+    # Composited arrays are cached per content key (see composite_key), so variants drawn from pixel-identical
+    # sprites share one array; scaled copies are cached by the caller per zoom under the same key.
+    # With share_identical off, sprites are keyed by index instead and never hashed, for callers like the
+    # export that draw every variant once.
+    def __init__(self, tileset, sheet_cache, max_entries=SCALED_CACHE_SIZE, share_identical=True):
+        self.tileset = tileset
+        self.sheet_cache = sheet_cache
+        self.share_identical = share_identical
+        self.max_entries = max_entries
+        self.composites = OrderedDict() # content key -> RGBA array
+        self.keys = {} # (tile_id, variant) -> content key
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0 # Hits on a composite first built for another tile ID or variant
+
+    def sprite_location(self, sprite_info):
+        # (atlas, local sprite index) of one SpriteRecord, or None if its sheet can't be read
+        sprite_range = self.tileset.image_sprite_ranges.for_file(sprite_info.image)
+        if not sprite_range:
+            print(f"Error: Could not find sprite range for image {sprite_info.image} during display.")
+            return None
+        image_path = os.path.join(self.tileset.base_dir, sprite_info.image)
+        try:
+            atlas = self.sheet_cache.get(image_path, sprite_info.sprite_width, sprite_info.sprite_height)
+        except FileNotFoundError:
+            print(f"Error: Image file not found for display: {image_path}")
+            return None
+        except Exception as e:
+            print(f"Error loading image for display {image_path}: {e}")
+            return None
+
+        local_sprite_index = sprite_info.global_sprite_index - sprite_range[1]
+        if 0 <= local_sprite_index < len(atlas):
+            return atlas, local_sprite_index
+        print(f"Warning: Global sprite index {sprite_info.global_sprite_index} ({sprite_info.image}) is out of bounds during display.")
+        return None
+
+    def variants(self, tile_id):
+        # List of (label, fg record or None, bg record or None, quarter turns clockwise, group position):
+        # one entry per rotation of every weighted variant group, groups in order
+        tile_id = self.tileset.resolve(tile_id)
+        sprites = self.tileset.tiles_data.get(tile_id, [])
+        fg_groups = group_variants(sprite_info for sprite_info in sprites if sprite_info.type == "fg")
+        bg_groups = group_variants(sprite_info for sprite_info in sprites if sprite_info.type == "bg")
+        if not fg_groups and not bg_groups:
+            return []
+
+        rotates = tile_id in self.tileset.tiles_data.rotating
+        total_weight = sum(weight for weight, _ in fg_groups)
+        variants = []
+        for group in range(max(len(fg_groups), len(bg_groups))):
+            fg = fg_groups[group % len(fg_groups)][1] if fg_groups else []
+            bg = bg_groups[group % len(bg_groups)][1] if bg_groups else []
+            weight_label = ""
+            if len(fg_groups) > 1:
+                weight = fg_groups[group % len(fg_groups)][0]
+                share = weight / total_weight if total_weight else 1 / len(fg_groups)
+                weight_label = f"weight {weight} ({share:.0%})"
+
+            if rotates and len(fg) == 1:
+                # A single rotating sprite is turned by the game itself
+                for turns in range(4):
+                    label = "\n".join(part for part in (weight_label, ROTATION_LABELS[turns]) if part)
+                    variants.append((label, fg[0], bg[0] if bg else None, turns, group))
+                continue
+
+            rotations = max(len(fg), len(bg))
+            for rotation in range(rotations):
+                rotation_label = f"rotation {rotation}" if rotations > 1 else ""
+                label = "\n".join(part for part in (weight_label, rotation_label) if part)
+                variants.append((label,
+                                 fg[rotation % len(fg)] if fg else None,
+                                 bg[rotation % len(bg)] if bg else None,
+                                 0, group))
+        return variants
+
+    def sprite_key(self, sprite_info, location):
+        if not self.share_identical:
+            return (sprite_info.image, sprite_info.global_sprite_index)
+        atlas, local_sprite_index = location
+        return atlas.sprite_key(local_sprite_index)
+
+    def resolve_variant(self, tile_id, variant):
+        # (content key, fg array, bg array, turns) of one variant, or None if nothing could be drawn
+        variants = self.variants(tile_id)
+        if not 0 <= variant < len(variants):
+            return None
+        _, fg_info, bg_info, turns, _ = variants[variant]
+        fg_location = self.sprite_location(fg_info) if fg_info else None
+        bg_location = self.sprite_location(bg_info) if bg_info else None
+        if fg_location is None and bg_location is None:
+            return None
+        fg_key = self.sprite_key(fg_info, fg_location) if fg_location else None
+        bg_key = self.sprite_key(bg_info, bg_location) if bg_location else None
+        turns = turns if fg_location else 0
+        fg_array = fg_location[0].sprite(fg_location[1]) if fg_location else None
+        bg_array = bg_location[0].sprite(bg_location[1]) if bg_location else None
+        return (fg_key, bg_key, turns), fg_array, bg_array, turns
+
+    def composite_key(self, tile_id, variant):
+        # (fg sprite key, bg sprite key, quarter turns) of one variant, or None if nothing could be drawn.
+        # Variants of any tile built from pixel-identical sprites get the same key.
+        key = (tile_id, variant)
+        content_key = self.keys.get(key)
+        if content_key is None:
+            resolved = self.resolve_variant(tile_id, variant)
+            if resolved is None:
+                return None
+            content_key = resolved[0]
+            self.keys[key] = content_key
+        return content_key
+
+    def composite(self, tile_id, variant):
+        # RGBA array of one variant with bg under fg, or None if nothing could be drawn
+        content_key = self.keys.get((tile_id, variant))
+        composited = self.composites.get(content_key) if content_key is not None else None
+        if composited is not None:
+            self.composites.move_to_end(content_key)
+            self.hits += 1
+            return composited
+
+        resolved = self.resolve_variant(tile_id, variant)
+        if resolved is None:
+            self.misses += 1
+            return None
+        content_key, fg_array, bg_array, turns = resolved
+        self.keys[(tile_id, variant)] = content_key
+        composited = self.composites.get(content_key)
+        if composited is not None:
+            # Same pixels as a variant drawn before, under another tile ID or variant
+            self.composites.move_to_end(content_key)
+            self.hits += 1
+            self.shared += 1
+            return composited
+
+        self.misses += 1
+        if fg_array is not None and turns:
+            fg_array = np.rot90(fg_array, k=-turns)
+
+        layers = [layer for layer in (bg_array, fg_array) if layer is not None]
+        if not layers:
+            return None
+        with perf_stats.timer("composite"):
+            height = max(layer.shape[0] for layer in layers)
+            width = max(layer.shape[1] for layer in layers)
+            composited = place_bottom_center(layers[0], height, width)
+            if len(layers) == 2:
+                composited = alpha_composite(composited, place_bottom_center(layers[1], height, width))
+            else:
+                composited = np.ascontiguousarray(composited)
+
+        self.composites[content_key] = composited
+        while len(self.composites) > self.max_entries:
+            self.composites.popitem(last=False)
+        return composited
+
+    def clear(self):
+        self.composites.clear()
+        self.keys.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "shared": self.shared, "entries": len(self.composites)}
+
+def additional_tiles(tile_entry):
+    # The well-formed sub-entries of a multitile entry; anything that isn't a dict is skipped
+    sub_entries = tile_entry.get("additional_tiles", [])
+    if not isinstance(sub_entries, list):
+        return []
+    return [sub_entry for sub_entry in sub_entries if isinstance(sub_entry, dict)]
+
+def referenced_sprites(tile_entry):
+    # Every global sprite index a tile entry uses, including those of its multitile sub-entries
+    for layer_name in LAYER_NAMES:
+        sprites_raw = tile_entry.get(layer_name)
+        if not isinstance(sprites_raw, list):
+            sprites_raw = [sprites_raw]
+        for item in sprites_raw:
+            sprite_indices = item.get("sprite") if isinstance(item, dict) else item
+            if not isinstance(sprite_indices, list):
+                sprite_indices = [sprite_indices]
+            for global_sprite_index in sprite_indices:
+                if isinstance(global_sprite_index, int):
+                    yield global_sprite_index
+    if tile_entry.get("multitile"):
+        for sub_entry in additional_tiles(tile_entry):
+            yield from referenced_sprites(sub_entry)
+
+def combine_rows(rows):
+    # One RGBA image with each row's arrays side by side, rows stacked top to bottom, 10px padding and 20px spacing
+    width = max(sum(sprite.shape[1] + 20 for sprite in arrays) for arrays in rows) + 10
+    row_heights = [max(sprite.shape[0] for sprite in arrays) for arrays in rows]
+    combined = np.zeros((sum(row_heights) + 10 * len(rows), width, 4), dtype=np.uint8)
+    paste_y_offset = 10
+    for arrays, row_height in zip(rows, row_heights):
+        paste_x_offset = 10
+        for composited in arrays:
+            sprite_height, sprite_width = composited.shape[:2]
+            combined[paste_y_offset:paste_y_offset + sprite_height, paste_x_offset:paste_x_offset + sprite_width] = composited
+            paste_x_offset += sprite_width + 20
+        paste_y_offset += row_height + 10
+    return Image.fromarray(combined, "RGBA")
+
+def format_index_ranges(indices):
+    # "3-7, 12, 15-16" for sorted sprite indices
+    runs = []
+    for index in indices:
+        if runs and index == runs[-1][1] + 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return ", ".join(str(first) if first == last else f"{first}-{last}" for first, last in runs)
+
+def sprite_usage(base_dir, sprite_ranges, referenced, sheet_cache):
+    # Per sheet, in sheet order: pixel-identical sprite groups and sprites no tile draws, as global sprite indices.
+    # sprite_ranges and referenced (global indices some tile draws) are copies, so this can run off the Tk thread.
+    usage = []
+    for file_name, start_index, end_index, sprite_width, sprite_height in sprite_ranges:
+        sheet = {"file": file_name, "sprites": 0, "duplicates": [], "unreferenced": [], "error": None}
+        usage.append(sheet)
+        if end_index < start_index:
+            continue
+        try:
+            atlas = sheet_cache.get(os.path.join(base_dir, file_name), sprite_width, sprite_height)
+        except Exception as e:
+            sheet["error"] = str(e)
+            continue
+        sheet["sprites"] = len(atlas)
+        sheet["duplicates"] = [[start_index + local_sprite_index for local_sprite_index in group]
+                               for group in atlas.duplicate_groups()]
+        sheet["unreferenced"] = [global_sprite_index for global_sprite_index in range(start_index, start_index + len(atlas))
+                                 if global_sprite_index not in referenced]
+    return usage
+
+def tileset_sprite_usage(tileset, sheet_cache):
+    return sprite_usage(tileset.base_dir, list(tileset.image_sprite_ranges), set(tileset.ids_by_sprite), sheet_cache)
+
+def sprite_usage_report(usage):
+    sprites = sum(sheet["sprites"] for sheet in usage)
+    duplicates = sum(len(group) - 1 for sheet in usage for group in sheet["duplicates"])
+    unreferenced = sum(len(sheet["unreferenced"]) for sheet in usage)
+    lines = [f"{sprites} sprites in {len(usage)} sheets: {duplicates} duplicates, {unreferenced} unreferenced"]
+    for sheet in usage:
+        lines.append("")
+        if sheet["error"]:
+            lines.append(f"{sheet['file']}: could not be read ({sheet['error']})")
+            continue
+        sheet_duplicates = sum(len(group) - 1 for group in sheet["duplicates"])
+        lines.append(f"{sheet['file']}: {sheet['sprites']} sprites, {sheet_duplicates} duplicates, "
+                     f"{len(sheet['unreferenced'])} unreferenced")
+        # Each group lists the first copy, then the sprites identical to it
+        lines.extend(f"  {group[0]} = {format_index_ranges(group[1:])}" for group in sheet["duplicates"])
+        if sheet["unreferenced"]:
+            lines.append(f"  Unreferenced: {format_index_ranges(sheet['unreferenced'])}")
+    return "\n".join(lines)
+
+def subtile_id(tile_id, sub_name):
+    # Tree / tiles_data ID of a multitile's additional tile, e.g. "t_wall:corner"
+    return f"{tile_id}:{sub_name}"
+
+class TileGraph:
+    # Edges between tile IDs that don't come from sprites: looks_like fallbacks and multitile sub-tiles.
+    # Built once while parsing; looks_like chains are resolved lazily and memoized.
+    def __init__(self):
+        self.looks_like = {} # tile_id -> tile_id it falls back to
+        self.subtiles = {} # multitile tile_id -> {sub name: sub-tile ID}
+        self.resolved = {} # tile_id -> tile_id with sprites, or None; filled in by resolve
+
+    def resolve(self, tile_id, tiles_data):
+        if tile_id in self.resolved:
+            return self.resolved[tile_id]
+
+        chain = []
+        visited = set()
+        current = tile_id
+        result = None
+        while current is not None:
+            if current in self.resolved:
+                result = self.resolved[current]
+                break
+            if current in visited:
+                print(f"Warning: looks_like cycle through {current} while resolving {tile_id}")
+                break
+            visited.add(current)
+            chain.append(current)
+            if current in tiles_data:
+                result = current
+                break
+            current = self.looks_like.get(current)
+
+        # Everything on the chain ends at the same tile, so later lookups are O(1)
+        for chained_id in chain:
+            self.resolved[chained_id] = result
+        return result
+
+CONTACT_LABEL_HEIGHT = 12 # Pixels under each contact sheet cell for its tile ID
+CONTACT_PADDING = 4 # Gap between contact sheet cells
+
+class ContactSheet:
+    # Whole-sheet grid view. Each cell is one sprite plus the ID of a tile that uses it.
+    # Only the cells inside the requested viewport are scaled (in one fancy-indexing pass) and labelled,
+    # and the result is a single image, however many sprites the sheet has.
+    def __init__(self, atlas, first_sprite_index, ids_by_sprite, zoom_level):
+        self.atlas = atlas
+        self.zoom_level = zoom_level
+        self.scaled_width = max(1, int(atlas.sprite_width * zoom_level))
+        self.scaled_height = max(1, int(atlas.sprite_height * zoom_level))
+        self.cell_width = self.scaled_width + CONTACT_PADDING
+        self.cell_height = self.scaled_height + CONTACT_LABEL_HEIGHT + CONTACT_PADDING
+        self.width = atlas.columns * self.cell_width
+        self.height = atlas.rows * self.cell_height
+
+        # Nearest-neighbour source rows/columns for every scaled pixel
+        self.source_ys = np.minimum((np.arange(self.scaled_height) / zoom_level).astype(np.intp), atlas.sprite_height - 1)
+        self.source_xs = np.minimum((np.arange(self.scaled_width) / zoom_level).astype(np.intp), atlas.sprite_width - 1)
+
+        self.labels = []
+        self.cell_tile_ids = [] # Tile ID named in each cell's label, or None
+        for local_sprite_index in range(len(atlas)):
+            tile_ids = ids_by_sprite.get(first_sprite_index + local_sprite_index, [])
+            self.cell_tile_ids.append(min(tile_ids) if tile_ids else None)
+            label = min(tile_ids) if tile_ids else ""
+            if len(tile_ids) > 1:
+                label += f" +{len(tile_ids) - 1}"
+            self.labels.append(label)
+
+    def cell_at(self, x, y):
+        # Local sprite index under content coordinates (x, y), or None
+        column, row = x // self.cell_width, y // self.cell_height
+        if 0 <= column < self.atlas.columns and 0 <= row < self.atlas.rows:
+            return row * self.atlas.columns + column
+        return None
+
+    def render(self, x, y, width, height):
+        # Image of the content area with its top-left corner at (x, y)
+        frame = np.zeros((max(height, 1), max(width, 1), 4), dtype=np.uint8)
+        first_row, first_column = max(y // self.cell_height, 0), max(x // self.cell_width, 0)
+        last_row = min((y + height) // self.cell_height + 1, self.atlas.rows)
+        last_column = min((x + width) // self.cell_width + 1, self.atlas.columns)
+        if first_row >= last_row or first_column >= last_column:
+            return Image.fromarray(frame, "RGBA")
+
+        # (rows, columns, h, w, 4) block of visible sprites, scaled all at once
+        grid = self.atlas.sprites.reshape(self.atlas.rows, self.atlas.columns, self.atlas.sprite_height, self.atlas.sprite_width, 4)
+        block = grid[first_row:last_row, first_column:last_column]
+        block = block[:, :, self.source_ys][:, :, :, self.source_xs]
+
+        cells = np.zeros((block.shape[0], block.shape[1], self.cell_height, self.cell_width, 4), dtype=np.uint8)
+        cells[:, :, :self.scaled_height, :self.scaled_width] = block
+        cells = cells.transpose(0, 2, 1, 3, 4).reshape(block.shape[0] * self.cell_height, block.shape[1] * self.cell_width, 4)
+
+        # Copy the part of the visible cells that overlaps the viewport
+        origin_x, origin_y = first_column * self.cell_width, first_row * self.cell_height
+        crop_x, crop_y = max(x - origin_x, 0), max(y - origin_y, 0)
+        dest_x, dest_y = max(origin_x - x, 0), max(origin_y - y, 0)
+        copy_width = min(cells.shape[1] - crop_x, width - dest_x)
+        copy_height = min(cells.shape[0] - crop_y, height - dest_y)
+        frame[dest_y:dest_y + copy_height, dest_x:dest_x + copy_width] = cells[crop_y:crop_y + copy_height, crop_x:crop_x + copy_width]
+
+        image = Image.fromarray(frame, "RGBA")
+        draw = ImageDraw.Draw(image)
+        max_chars = max(self.cell_width // 6, 1)
+        for row in range(first_row, last_row):
+            for column in range(first_column, last_column):
+                label = self.labels[row * self.atlas.columns + column]
+                if label:
+                    text_x = column * self.cell_width - x
+                    text_y = row * self.cell_height + self.scaled_height - y
+                    draw.text((text_x, text_y), label[:max_chars], fill=(255, 255, 255, 255))
+        return image
+
+# (sub-tile, rotation) of a multitile cell, indexed by which neighbours share its tile ID.
+# Bits follow the game: 1 south, 2 east, 4 west, 8 north.
+CONNECTION_SUBTILES = (
+    ("unconnected", 0), ("end_piece", 0), ("end_piece", 1), ("corner", 0),
+    ("end_piece", 3), ("corner", 3), ("edge", 1), ("t_connection", 0),
+    ("end_piece", 2), ("edge", 0), ("corner", 1), ("t_connection", 1),
+    ("corner", 2), ("t_connection", 3), ("t_connection", 2), ("center", 0),
+)
+
+def connection_masks(codes):
+    # Connection mask of every cell: which of its 4 neighbours hold the same tile
+    masks = np.zeros(codes.shape, dtype=np.int64)
+    masks[:-1] |= (codes[:-1] == codes[1:]) * 1 # South
+    masks[:, :-1] |= (codes[:, :-1] == codes[:, 1:]) * 2 # East
+    masks[:, 1:] |= (codes[:, 1:] == codes[:, :-1]) * 4 # West
+    masks[1:] |= (codes[1:] == codes[:-1]) * 8 # North
+    return masks
+
+def load_map_layout(path):
+    # Layout file: {"legend": {"#": "t_wall", ".": "t_floor"}, "rows": ["#####", "#...#", ...]}.
+    # Characters missing from the legend are left empty. Returns (tile IDs, codes array) like random_map_layout.
+    with open(path, "r") as f:
+        layout = json.load(f)
+    legend = layout.get("legend", {})
+    rows = layout.get("rows", [])
+    names = sorted({tile_id for tile_id in legend.values() if tile_id})
+    code_by_char = {char: names.index(tile_id) for char, tile_id in legend.items() if tile_id}
+    codes = np.full((len(rows), max((len(row) for row in rows), default=0)), -1, dtype=np.int64)
+    for y, row in enumerate(rows):
+        for x, char in enumerate(row):
+            codes[y, x] = code_by_char.get(char, -1)
+    return names, codes
+
+def random_map_layout(tileset, width, height, rng=None):
+    # Grass-like ground scattered with other terrain, plus rectangular rooms walled with a connecting tile.
+    # Returns (tile IDs, width x height array of indices into them).
+    rng = rng or np.random.default_rng()
+    terrain = [tile_id for tile_id in sorted(tileset.tiles_data.slices.keys() | tileset.tile_graph.looks_like.keys())
+               if tile_id.startswith("t_") and ":" not in tile_id and tileset.resolve(tile_id) is not None]
+    if not terrain:
+        terrain = [tile_id for tile_id in sorted(tileset.tiles_data.slices) if ":" not in tile_id]
+    if not terrain:
+        return [], np.full((height, width), -1, dtype=np.int64)
+    ground = next((tile_id for tile_id in ("t_grass", "t_dirt", "t_floor") if tile_id in terrain), terrain[0])
+    floor = "t_floor" if "t_floor" in terrain else ground
+    walls = [tile_id for tile_id in terrain if tile_id in tileset.tile_graph.subtiles]
+    wall = "t_wall" if "t_wall" in walls else (walls[0] if walls else None)
+
+    names = list(dict.fromkeys(terrain + [ground, floor] + ([wall] if wall else [])))
+    codes = np.full((height, width), names.index(ground), dtype=np.int64)
+    scatter = rng.random((height, width)) < 0.05
+    codes[scatter] = rng.integers(0, len(terrain), int(scatter.sum()))
+    if wall is not None:
+        for _ in range(width * height // 150):
+            room_width, room_height = rng.integers(4, 13, 2)
+            x, y = rng.integers(0, max(width - room_width, 1)), rng.integers(0, max(height - room_height, 1))
+            codes[y:y + room_height, x:x + room_width] = names.index(wall)
+            codes[y + 1:y + room_height - 1, x + 1:x + room_width - 1] = names.index(floor)
+            codes[y + room_height - 1, x + room_width // 2] = names.index(floor) # Doorway
+    return names, codes
+
+class MapPreview:
+    # A grid of tile IDs drawn the way the game lays them out, one sprite per cell.
+    # Every distinct look of a cell (tile or connected sub-tile, variant, rotation) is composited once into a
+    # "stamp"; frames are then a single fancy-indexing gather of stamps, and panning reuses the previous
+    # frame so only the newly exposed strips are drawn.
+    def __init__(self, tileset, renderer, names, codes, rng=None):
+        self.tileset = tileset
+        self.renderer = renderer
+        self.rows, self.columns = codes.shape
+        rng = rng or np.random.default_rng()
+
+        # Cells are the most common sprite size; larger sprites are clipped to their cell, bottom-centred
+        size_counts = {}
+        for _, start_index, end_index, sprite_width, sprite_height in tileset.image_sprite_ranges:
+            if end_index >= start_index:
+                size_counts[(sprite_width, sprite_height)] = size_counts.get((sprite_width, sprite_height), 0) + 1
+        self.cell_width, self.cell_height = max(size_counts, key=size_counts.get) if size_counts else (32, 32)
+
+        # Look of every cell as (tile ID to draw, rotation), before variants are picked
+        draw_names = [] # (tile ID, rotation) per look
+        look_ids = np.full(codes.shape, -1, dtype=np.int64)
+        masks = connection_masks(codes)
+        for code, tile_id in enumerate(names):
+            cells = codes == code
+            subtiles = tileset.tile_graph.subtiles.get(tile_id)
+            if not subtiles:
+                look_ids[cells] = len(draw_names)
+                draw_names.append((tile_id, 0))
+                continue
+            for mask in np.unique(masks[cells]):
+                sub_name, rotation = CONNECTION_SUBTILES[mask]
+                look_ids[cells & (masks == mask)] = len(draw_names)
+                draw_names.append((subtiles.get(sub_name, tile_id), rotation))
+
+        # Pick weighted variants per cell, then number the distinct drawings as stamps; looks that come out
+        # pixel-identical (shared sprites, or variants that only differ in name) share one stamp
+        self.stamp_ids = np.zeros(codes.shape, dtype=np.int64) # 0 is the empty stamp
+        stamp_arrays = [np.zeros((self.cell_height, self.cell_width, 3), dtype=np.uint8)]
+        stamp_by_key = {} # renderer content key -> stamp id
+        for look, (tile_id, rotation) in enumerate(draw_names):
+            cells = np.nonzero(look_ids == look)
+            spans = self.variant_spans(tile_id)
+            if not spans:
+                continue
+            variant_table = tileset.tiles_data.variant_tables.get(tileset.resolve(tile_id))
+            if variant_table is None:
+                groups = np.zeros(len(cells[0]), dtype=np.int64)
+            else:
+                groups = np.searchsorted(variant_table.groups, tileset.sample_variants(tile_id, len(cells[0]), rng))
+            for group in np.unique(groups):
+                first, count = spans[min(group, len(spans) - 1)]
+                variant = first + rotation % count
+                content_key = renderer.composite_key(tile_id, variant)
+                stamp_id = stamp_by_key.get(content_key)
+                if stamp_id is None:
+                    stamp = self.cell_stamp(tile_id, variant)
+                    if stamp is None:
+                        continue
+                    stamp_id = stamp_by_key[content_key] = len(stamp_arrays)
+                    stamp_arrays.append(stamp)
+                selected = groups == group
+                self.stamp_ids[cells[0][selected], cells[1][selected]] = stamp_id
+        self.stamps = np.stack(stamp_arrays) # (n_stamps, cell_height, cell_width, 3)
+
+        self.zoom_level = None
+        self.scaled_stamps = None
+        self.frame = None # Last rendered frame and the content position it shows
+        self.frame_x = self.frame_y = 0
+        self.redrawn_pixels = 0 # Pixels actually drawn by the last render
+        self.set_zoom(1.0)
+
+    def variant_spans(self, tile_id):
+        # (first position in renderer.variants, number of rotations) of each variant group
+        spans = []
+        for position, variant in enumerate(self.renderer.variants(tile_id)):
+            group = variant[4]
+            if group == len(spans):
+                spans.append((position, 0))
+            spans[group] = (spans[group][0], spans[group][1] + 1)
+        return spans
+
+    def cell_stamp(self, tile_id, variant):
+        # The composited variant fitted to one cell and flattened onto black, or None
+        composited = self.renderer.composite(tile_id, variant)
+        if composited is None:
+            return None
+        height, width = composited.shape[:2]
+        canvas = np.zeros((self.cell_height, self.cell_width, 4), dtype=np.uint8)
+        # Bottom-centre the sprite, cropping whatever doesn't fit
+        crop_y, crop_x = max(height - self.cell_height, 0), max((width - self.cell_width) // 2, 0)
+        dest_x = max((self.cell_width - width) // 2, 0)
+        visible = composited[crop_y:, crop_x:crop_x + self.cell_width]
+        canvas[self.cell_height - visible.shape[0]:, dest_x:dest_x + visible.shape[1]] = visible
+        alpha = canvas[..., 3:4].astype(np.uint16)
+        return (canvas[..., :3] * alpha // 255).astype(np.uint8)
+
+    def set_zoom(self, zoom_level):
+        zoom_level = zoom_bucket(zoom_level)
+        if zoom_level == self.zoom_level:
+            return
+        self.zoom_level = zoom_level
+        self.scaled_width = max(1, int(self.cell_width * zoom_level))
+        self.scaled_height = max(1, int(self.cell_height * zoom_level))
+        source_ys = np.minimum((np.arange(self.scaled_height) / zoom_level).astype(np.intp), self.cell_height - 1)
+        source_xs = np.minimum((np.arange(self.scaled_width) / zoom_level).astype(np.intp), self.cell_width - 1)
+        self.scaled_stamps = np.ascontiguousarray(self.stamps[:, source_ys][:, :, source_xs])
+        self.frame = None # Every pixel changes
+
+    @property
+    def width(self):
+        return self.columns * self.scaled_width
+
+    @property
+    def height(self):
+        return self.rows * self.scaled_height
+
+    def render_region(self, x, y, width, height):
+        # RGB array of the content area with its top-left corner at (x, y)
+        region = np.zeros((height, width, 3), dtype=np.uint8)
+        first_row, first_column = max(y // self.scaled_height, 0), max(x // self.scaled_width, 0)
+        last_row = min((y + height - 1) // self.scaled_height + 1, self.rows)
+        last_column = min((x + width - 1) // self.scaled_width + 1, self.columns)
+        if width <= 0 or height <= 0 or first_row >= last_row or first_column >= last_column:
+            return region
+
+        # (rows, columns, h, w, 3) block of the visible cells' stamps in one gather
+        block = self.scaled_stamps[self.stamp_ids[first_row:last_row, first_column:last_column]]
+        cells = block.transpose(0, 2, 1, 3, 4).reshape(block.shape[0] * self.scaled_height, block.shape[1] * self.scaled_width, 3)
+
+        origin_x, origin_y = first_column * self.scaled_width, first_row * self.scaled_height
+        crop_x, crop_y = max(x - origin_x, 0), max(y - origin_y, 0)
+        dest_x, dest_y = max(origin_x - x, 0), max(origin_y - y, 0)
+        copy_width = min(cells.shape[1] - crop_x, width - dest_x)
+        copy_height = min(cells.shape[0] - crop_y, height - dest_y)
+        region[dest_y:dest_y + copy_height, dest_x:dest_x + copy_width] = cells[crop_y:crop_y + copy_height, crop_x:crop_x + copy_width]
+        return region
+
+    def render(self, x, y, width, height):
+        # Frame of width x height showing the content at (x, y). The array is reused between calls.
+        frame = self.frame
+        dx, dy = x - self.frame_x, y - self.frame_y
+        if frame is None or frame.shape[:2] != (height, width) or abs(dx) >= width or abs(dy) >= height:
+            self.frame = self.render_region(x, y, width, height)
+            self.frame_x, self.frame_y = x, y
+            self.redrawn_pixels = width * height
+            return self.frame
+
+        # Pan: move what is still visible, then draw the exposed strips (dirty regions) only
+        frame[max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)] = \
+            frame[max(dy, 0):height - max(-dy, 0), max(dx, 0):width - max(-dx, 0)]
+        self.redrawn_pixels = 0
+        if dy:
+            strip_y = height - dy if dy > 0 else 0
+            frame[strip_y:strip_y + abs(dy)] = self.render_region(x, y + strip_y, width, abs(dy))
+            self.redrawn_pixels += width * abs(dy)
+        if dx:
+            strip_x = width - dx if dx > 0 else 0
+            frame[:, strip_x:strip_x + abs(dx)] = self.render_region(x + strip_x, y, abs(dx), height)
+            self.redrawn_pixels += abs(dx) * height
+        self.frame_x, self.frame_y = x, y
+        return frame
+
+class LoadCancelled(Exception):
+    pass
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def user_cache_dir():
+    # Per-user directory for caches that must survive restarts
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "cdda-tile-viewer")
+
+def read_png_size(image_path):
+    # Width and height from the IHDR chunk, which always directly follows the PNG signature.
+    # Returns None for anything that isn't a PNG.
+    with open(image_path, "rb") as f:
+        header = f.read(24)
+    if len(header) == 24 and header[:8] == PNG_SIGNATURE and header[12:16] == b"IHDR":
+        return struct.unpack(">II", header[16:24])
+    return None
+
+def probe_sheet_size(image_path):
+    size = read_png_size(image_path)
+    if size is not None:
+        return size
+    # Not a PNG: let PIL read just the header of whatever format it is
+    img = Image.open(image_path)
+    try:
+        return img.width, img.height
+    finally:
+        img.close() # Explicitly close the image file
+
+class SheetSizeCache:
+    # On-disk record of sheet dimensions for one pack, keyed by path with file size and mtime for validation.
+    # Reopening an unchanged pack then costs one stat() per sheet instead of opening every file.
+    def __init__(self, base_dir, cache_dir=None):
+        cache_dir = cache_dir or user_cache_dir()
+        digest = hashlib.sha1(os.path.abspath(base_dir).encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, f"sheet_sizes_{digest}.json")
+        self.lock = threading.Lock()
+        self.changed = False
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        if not isinstance(entries, dict):
+            entries = {} # Valid JSON but not ours, e.g. a truncated rewrite or an edited file
+        # Keep only [size, mtime_ns, width, height] entries; anything else would break probe()
+        self.entries = {image_path: entry for image_path, entry in entries.items()
+                        if isinstance(entry, list) and len(entry) == 4
+                        and all(isinstance(value, int) and not isinstance(value, bool) for value in entry)}
+
+    def probe(self, image_path):
+        stat = os.stat(image_path) # Raises FileNotFoundError like Image.open would
+        with self.lock:
+            entry = self.entries.get(image_path)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2], entry[3]
+
+        width, height = probe_sheet_size(image_path)
+        with self.lock:
+            self.entries[image_path] = [stat.st_size, stat.st_mtime_ns, width, height]
+            self.changed = True
+        return width, height
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.tmp" # Per process, so concurrent loads of one pack don't collide
+            with open(temp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(temp_path, self.path) # Readers see the old file or the new one, never a truncated one
+            self.changed = False
+        except OSError as e:
+            print(f"Warning: Could not write sheet size cache {self.path}: {e}")
+
+NUMBER_TAIL_CHARS = "0123456789.eE+-" # Characters that can continue a JSON number
+
+class JsonStreamReader:
+    # Pulls a text file in chunks and decodes one JSON value at a time from it.
+    # Consumed text is dropped on the next refill, so only the value being decoded is ever buffered.
+    def __init__(self, f, chunk_size=STREAM_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.consumed = 0 # Characters dropped from the front of the buffer so far
+        self.eof = False
+        self.last_span = (0, 0) # Buffer span of the value returned last
+
+    def position(self):
+        return self.consumed + self.pos
+
+    def last_text(self):
+        # Source text of the value returned last; valid until the next read
+        return self.buffer[self.last_span[0]:self.last_span[1]]
+
+    def fill(self, size):
+        # Reads at least one more chunk; returns False at end of file
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.consumed += self.pos
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # Next non-whitespace character, or "" at end of file
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill(self.chunk_size):
+                return ""
+
+    def expect(self, chars):
+        # Consumes the next character, which must be one of chars, and returns it
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at character {self.position()} of tile_config.json, found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        read_size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number running into the end of the buffer may continue in the next chunk, and one cut
+                # inside its fraction or exponent ("1.", "-2.5E") decodes as the part before it
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in NUMBER_TAIL_CHARS):
+                    self.last_span = (self.pos, end)
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self.fill(read_size):
+                continue # Decode once more now that eof is known
+            read_size *= 2 # Large values: grow reads so re-decoding stays linear overall
+
+def iter_tile_config(reader):
+    # Yields (key, value) for each top-level member of a tile_config.json read through a JsonStreamReader,
+    # except that "tiles-new" is yielded once per tile set, as soon as that tile set has been read
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == "tiles-new" and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield key, reader.value()
+                    if reader.expect(",]") == "]":
+                        break
+        else:
+            yield key, reader.value()
+        if reader.expect(",}") == "}":
+            return
+
+class Tileset:
+    # Parsed form of one tile_config.json. Has no Tk dependency so it can be built on a worker thread.
+    # tile_config is None when the tileset was restored from TilesetCache.
+    def __init__(self, tile_config, base_dir):
+        self.tile_config = tile_config
+        self.base_dir = base_dir # Base directory of the config file
+        self.config_path = None # Set by load_tileset, for watching the pack for edits
+        self.image_sprite_ranges = SpriteRangeIndex() # (file_name, start_index, end_index, sprite_width, sprite_height), searchable by sprite index
+        self.tiles_data = TileTable(self.image_sprite_ranges) # Sprites of each tile_id, as SpriteRecord lists
+        self.tiles_by_file = {} # Stores tile_ids grouped by file_name
+        self.sorted_tiles_by_file = {} # Same as tiles_by_file, as sorted lists
+        self.tile_graph = TileGraph() # looks_like fallbacks and multitile sub-tiles
+        self.ids_by_sprite = {} # global sprite index -> tile IDs using it
+        self.search_index = TileSearchIndex({})
+        self.entry_count = 0 # Tile entries read so far, numbering them in config order
+
+    def parse(self, progress=None, cancel_event=None):
+        # progress(done, total, message) is called from this thread after every sheet / tile set.
+        # Setting cancel_event makes parse raise LoadCancelled at the next check.
+        if not self.tile_config or "tiles-new" not in self.tile_config:
+            return
+
+        tile_sets = [tile_set for tile_set in self.tile_config.get("tiles-new", []) if tile_set.get("file")]
+        total_steps = 2 * len(tile_sets)
+
+        def check_cancelled():
+            if cancel_event is not None and cancel_event.is_set():
+                raise LoadCancelled()
+
+        def report(done, message):
+            if progress is not None:
+                progress(done, total_steps, message)
+
+        # First pass: Determine sprite index ranges without loading images.
+        # Sheet headers are probed in parallel, then ranges are assigned in config order.
+        size_cache = SheetSizeCache(self.base_dir)
+        executor = ThreadPoolExecutor(max_workers=PROBE_WORKERS)
+        try:
+            size_futures = [executor.submit(size_cache.probe, os.path.join(self.base_dir, tile_set["file"])) for tile_set in tile_sets]
+            for step, (tile_set, size_future) in enumerate(zip(tile_sets, size_futures)):
+                check_cancelled()
+                report(step, f"Reading {tile_set['file']}")
+                self.add_sheet_range(tile_set, self.tile_config.get("tile_info"), size_future.result)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        size_cache.save()
+
+        # Second pass: Parse tile data using global sprite indices
+        for step, tile_set in enumerate(tile_sets, start=len(tile_sets)):
+             check_cancelled()
+             report(step, f"Parsing tiles in {tile_set['file']}")
+             self.parse_tile_set(tile_set)
+
+        self.build_indexes()
+        report(total_steps, "Done")
+
+    def parse_stream(self, f, progress=None, cancel_event=None, on_tile_set=None):
+        # Parses a tile_config.json file object without ever holding the whole document.
+        # Each tile set is indexed as soon as it has been read; on_tile_set(self, sorted_tiles_by_file) is then
+        # called with the freshly sorted tile IDs of every sheet that gained tiles, so early sheets can be
+        # browsed while the rest of the file is still being read.
+        # progress(done, total, message) counts characters read out of the file size.
+        # Sheet headers are probed in parallel as their tile sets arrive; tile sets are still indexed in config order.
+        total_size = os.fstat(f.fileno()).st_size
+        self.tile_config = {} # Top-level members other than tiles-new, e.g. tile_info
+        size_cache = SheetSizeCache(self.base_dir)
+        queued_tile_sets = deque() # (tile set, future of its sheet size), in config order, waiting to be indexed
+        deferred_entries = [] # Entries using sprites of sheets that haven't been read yet
+
+        def check_cancelled():
+            if cancel_event is not None and cancel_event.is_set():
+                raise LoadCancelled()
+
+        def add_tile_set(tile_set, read_size):
+            self.add_sheet_range(tile_set, self.tile_config.get("tile_info"), read_size)
+            sizes = {name: len(tile_ids) for name, tile_ids in self.tiles_by_file.items()}
+            self.parse_tile_set(tile_set, deferred_entries)
+            if on_tile_set is not None:
+                changed = {name: sorted(tile_ids, key=lambda tile_id: (tile_id.lower(), tile_id))
+                           for name, tile_ids in self.tiles_by_file.items() if sizes.get(name) != len(tile_ids)}
+                if changed:
+                    on_tile_set(self, changed)
+
+        def index_queued(wait=False):
+            # Index queued tile sets whose sheet size is known. A set is only waited for once PROBE_WORKERS
+            # later sets are queued behind it, or with wait; tile sets read before tile_info (which supplies
+            # their default sprite size) stay queued until it arrives.
+            while queued_tile_sets and (wait or "tile_info" in self.tile_config):
+                tile_set, size_future = queued_tile_sets[0]
+                if not (wait or size_future.done() or len(queued_tile_sets) > PROBE_WORKERS):
+                    break
+                queued_tile_sets.popleft()
+                add_tile_set(tile_set, size_future.result)
+
+        reader = JsonStreamReader(f)
+        executor = ThreadPoolExecutor(max_workers=PROBE_WORKERS)
+        try:
+            for key, value in iter_tile_config(reader):
+                check_cancelled()
+                if key != "tiles-new":
+                    self.tile_config[key] = value
+                    if key == "tile_info":
+                        index_queued()
+                    continue
+                if not value.get("file"):
+                    continue
+                if progress is not None:
+                    progress(reader.position(), total_size, f"Parsing tiles in {value['file']}")
+                queued_tile_sets.append((value, executor.submit(size_cache.probe, os.path.join(self.base_dir, value["file"]))))
+                index_queued()
+            index_queued(wait=True) # Without any tile_info, sets without their own sprite size get invalid ranges
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            size_cache.save()
+
+        # Forward references can only be resolved once every sheet has a range
+        for tile_ids, tile_entry, file_name, definition in deferred_entries:
+            self.parse_tile_entry(tile_ids, tile_entry, file_name, definition)
+        self.build_indexes()
+        if progress is not None:
+            progress(total_size, total_size, "Done")
+
+    def add_sheet_range(self, tile_set, tile_info, read_size):
+        # Appends the range of tile_set's sheet after the ranges added so far.
+        # read_size() returns the sheet's (width, height).
+        file_name = tile_set["file"]
+        image_path = os.path.join(self.base_dir, file_name)
+        current_sprite_index = self.image_sprite_ranges.next_index() # Global cumulative index
+        try:
+            image_width, image_height = read_size()
+            sprite_width = tile_set.get("sprite_width", tile_info[0]["width"])
+            sprite_height = tile_set.get("sprite_height", tile_info[0]["height"])
+
+            sprites_in_image = (image_width // sprite_width) * (image_height // sprite_height)
+            start_index = current_sprite_index
+            end_index = current_sprite_index + sprites_in_image - 1
+            self.image_sprite_ranges.append((file_name, start_index, end_index, sprite_width, sprite_height))
+
+        except FileNotFoundError:
+            print(f"Warning: Image file not found: {image_path}")
+            # Still add a range entry so subsequent indices are correct
+            self.image_sprite_ranges.append((file_name, current_sprite_index, current_sprite_index -1, 0, 0)) # Invalid range
+        except Exception as e:
+            print(f"Warning: Could not process image {image_path} for dimensions: {e}")
+            self.image_sprite_ranges.append((file_name, current_sprite_index, current_sprite_index -1, 0, 0)) # Invalid range
+
+    def parse_tile_set(self, tile_set, deferred_entries=None):
+        # With deferred_entries, entries that use sprites beyond the ranges known so far are
+        # collected there as (tile_ids, tile_entry, file_name, definition) instead of being parsed
+        file_name = tile_set["file"]
+        next_index = self.image_sprite_ranges.next_index()
+        for tile_entry in tile_set.get("tiles", []):
+            tile_ids = tile_entry.get("id")
+            if not tile_ids:
+                continue
+
+            if not isinstance(tile_ids, list):
+                tile_ids = [tile_ids]
+
+            definition = self.entry_count
+            self.entry_count += 1
+            if deferred_entries is not None and max(referenced_sprites(tile_entry), default=-1) >= next_index:
+                deferred_entries.append((tile_ids, tile_entry, file_name, definition))
+                continue
+            self.parse_tile_entry(tile_ids, tile_entry, file_name, definition)
+
+    def parse_weight(self, raw_weight, layer_name):
+        # Weights go into an int column and a cumulative sum: non-numbers become 1, negatives 0
+        try:
+            weight = int(raw_weight)
+        except (TypeError, ValueError, OverflowError):
+            print(f"Warning: Invalid weight {raw_weight!r} in {layer_name} list, using 1.")
+            return 1
+        if weight < 0:
+            print(f"Warning: Negative weight {weight} in {layer_name} list, using 0.")
+            return 0
+        return min(weight, WEIGHT_MAX)
+
+    def parse_tile_entry(self, tile_ids, tile_entry, file_name, definition, inherited_rotates=False):
+        # definition is the entry's position in the config; IDs an earlier entry already defines are skipped
+        claimed = self.tiles_data.claim(tile_ids, definition)
+        for tile_id in tile_ids:
+            if tile_id not in claimed:
+                print(f"Warning: Tile ID '{tile_id}' is defined more than once, keeping the first definition.")
+        tile_ids = claimed
+        if not tile_ids:
+            return
+        for tile_id in tile_ids:
+            # An ID taken back from a later entry drops what that entry gave it
+            self.tile_graph.looks_like.pop(tile_id, None)
+            self.tile_graph.subtiles.pop(tile_id, None)
+
+        resolved_sprites = [] # (global_sprite_index, sheet_id, layer, variant, weight)
+        for layer, layer_name in enumerate(LAYER_NAMES):
+            sprites_raw = tile_entry.get(layer_name)
+            if sprites_raw is None:
+                continue
+
+            # Each {"weight", "sprite"} dict is its own weighted variant group; plain ints together form one group
+            sprite_list = [] # (variant, weight, sprite entry)
+            plain_group = None
+            next_group = 0
+            if not isinstance(sprites_raw, list):
+                sprites_raw = [sprites_raw]
+            for item in sprites_raw:
+                if isinstance(item, int):
+                    if plain_group is None:
+                        plain_group = next_group
+                        next_group += 1
+                    sprite_list.append((plain_group, 1, {"sprite": item}))
+                elif isinstance(item, dict):
+                    sprite_list.append((next_group, self.parse_weight(item.get("weight", 1), layer_name), item))
+                    next_group += 1
+                else:
+                    print(f"Warning: Unexpected type in {layer_name} list: {type(item)}")
+
+            for variant, weight, sprite_entry in sprite_list:
+                sprite_indices = sprite_entry.get("sprite")
+                if not isinstance(sprite_indices, list):
+                    sprite_indices = [sprite_indices] # A list here is the rotations of one variant
+                for global_sprite_index in sprite_indices:
+                    if global_sprite_index is None:
+                        continue
+                    # Find which image this global index belongs to
+                    sheet_id = self.image_sprite_ranges.find_position(global_sprite_index)
+
+                    if sheet_id >= 0:
+                        resolved_sprites.append((global_sprite_index, sheet_id, layer, variant, weight))
+                        # Populate tiles_by_file
+                        range_file_name = self.image_sprite_ranges.ranges[sheet_id][0]
+                        if range_file_name not in self.tiles_by_file:
+                            self.tiles_by_file[range_file_name] = set() # Use a set to avoid duplicate tile IDs per file
+                        self.tiles_by_file[range_file_name].update(tile_ids)
+
+                    else:
+                        print(f"Warning: Global sprite index {global_sprite_index} is outside of any defined image range.")
+
+        # All IDs of the entry share one slice of the sprite columns
+        rotates = tile_entry.get("rotates", inherited_rotates)
+        self.tiles_data.add(tile_ids, resolved_sprites, rotates)
+
+        looks_like = tile_entry.get("looks_like")
+        if looks_like:
+            for tile_id in tile_ids:
+                self.tile_graph.looks_like[tile_id] = looks_like
+            if not resolved_sprites:
+                # Nothing of its own to draw, but still list it under the sheet it was declared with
+                self.tiles_by_file.setdefault(file_name, set()).update(tile_ids)
+
+        # Connected walls, corners, broken/open states... become their own "parent:sub" entries
+        if tile_entry.get("multitile"):
+            sub_entries = additional_tiles(tile_entry)
+            raw_sub_entries = tile_entry.get("additional_tiles", [])
+            if not isinstance(raw_sub_entries, list) or len(sub_entries) != len(raw_sub_entries):
+                print(f"Warning: Skipping malformed additional_tiles entries in {file_name}")
+            for sub_entry in sub_entries:
+                sub_name = sub_entry.get("id")
+                if not sub_name or not isinstance(sub_name, str):
+                    continue
+                sub_tile_ids = [subtile_id(tile_id, sub_name) for tile_id in tile_ids]
+                for tile_id, sub_tile_id in zip(tile_ids, sub_tile_ids):
+                    self.tile_graph.subtiles.setdefault(tile_id, {})[sub_name] = sub_tile_id
+                self.parse_tile_entry(sub_tile_ids, sub_entry, file_name, definition, rotates)
+
+    def resolve(self, tile_id):
+        # The tile ID whose sprites tile_id is drawn with (itself, or a looks_like fallback), or None
+        return self.tile_graph.resolve(tile_id, self.tiles_data)
+
+    def sample_variant(self, tile_id, rng=random):
+        # Random fg variant group of tile_id, honouring weights
+        variant_table = self.tiles_data.variant_tables.get(self.resolve(tile_id))
+        return variant_table.sample(rng) if variant_table else 0
+
+    def sample_variants(self, tile_id, count, rng=None):
+        # Random fg variant groups for count cells at once
+        variant_table = self.tiles_data.variant_tables.get(self.resolve(tile_id))
+        if variant_table is None:
+            return np.zeros(count, dtype=np.int64)
+        return variant_table.sample_many(count, rng)
+
+    def snapshot(self):
+        # Frozen copy of what has been parsed so far, for the Tk thread to draw from while this thread carries on.
+        # Columns are copied up to their current length. Deferred entries, the sorted lists and the search index
+        # are left out; they only exist once the parse is done.
+        snapshot = Tileset(dict(self.tile_config), self.base_dir)
+        for sprite_range in self.image_sprite_ranges:
+            snapshot.image_sprite_ranges.append(sprite_range)
+        tiles_data = snapshot.tiles_data
+        tiles_data.sprite_indices = self.tiles_data.sprite_indices[:]
+        tiles_data.sheet_ids = self.tiles_data.sheet_ids[:]
+        tiles_data.layers = self.tiles_data.layers[:]
+        tiles_data.variants = self.tiles_data.variants[:]
+        tiles_data.weights = self.tiles_data.weights[:]
+        tiles_data.slices = dict(self.tiles_data.slices)
+        tiles_data.rotating = set(self.tiles_data.rotating)
+        snapshot.tile_graph.looks_like = dict(self.tile_graph.looks_like)
+        snapshot.tile_graph.subtiles = {tile_id: dict(subtiles) for tile_id, subtiles in self.tile_graph.subtiles.items()}
+        snapshot.entry_count = self.entry_count
+        snapshot.build_sprite_indexes()
+        return snapshot
+
+    def build_sprite_indexes(self):
+        # The indexes drawing needs
+        self.tiles_data.build_variant_tables()
+        # Reverse index for the contact sheet: global sprite index -> tile IDs drawn with it
+        self.ids_by_sprite = {}
+        for tile_id, (start, end) in self.tiles_data.slices.items():
+            for global_sprite_index in set(self.tiles_data.sprite_indices[start:end]):
+                self.ids_by_sprite.setdefault(global_sprite_index, []).append(tile_id)
+
+    def build_indexes(self):
+        self.build_sprite_indexes()
+        # Sort once here so the tree never has to re-sort on populate or search
+        # (case-insensitive, matching the order TileSearchIndex returns results in)
+        self.sorted_tiles_by_file = {file_name: sorted(tile_ids, key=lambda tile_id: (tile_id.lower(), tile_id))
+                                     for file_name, tile_ids in self.tiles_by_file.items()}
+        self.search_index = TileSearchIndex(self.tiles_by_file)
+
+    def replace_tile_sets(self, tile_ids, tile_sets):
+        # Hot reload of edited tile sets: forget everything about tile_ids, then parse the new tile sets.
+        # Sprite ranges must be unchanged. Sprites of the old entries stay in the columns, unreferenced.
+        tiles_data = self.tiles_data
+        for tile_id in tile_ids:
+            tiles_data.slices.pop(tile_id, None)
+            tiles_data.rotating.discard(tile_id)
+            tiles_data.definitions.pop(tile_id, None)
+            self.tile_graph.looks_like.pop(tile_id, None)
+            self.tile_graph.subtiles.pop(tile_id, None)
+        for file_name in self.tiles_by_file:
+            self.tiles_by_file[file_name] -= tile_ids
+        self.tile_graph.resolved.clear()
+        for tile_set in tile_sets:
+            self.parse_tile_set(tile_set)
+        # Sheets are only dropped once nothing was added back, so the others keep their place in the tree
+        for file_name in [file_name for file_name, file_tile_ids in self.tiles_by_file.items() if not file_tile_ids]:
+            del self.tiles_by_file[file_name]
+        self.build_indexes()
+
+def file_signature(path):
+    # (size, mtime_ns) of a file, or None if it doesn't exist
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+class TilesetCache:
+    # Compiled on-disk copy of a parsed Tileset, stored in the user cache dir.
+    # Layout: magic, then a length-prefixed JSON header (source signatures, interned string table, column lengths),
+    # then the packed integer columns of image_sprite_ranges and the TileTable in tiles_data.
+    MAGIC = b"CDTVIDX"
+    VERSION = 7 # Bumped whenever parsing changes what ends up in the columns
+
+    def __init__(self, config_path, cache_dir=None):
+        self.config_path = os.path.abspath(config_path)
+        cache_dir = cache_dir or user_cache_dir()
+        digest = hashlib.sha1(self.config_path.encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, f"tileset_{digest}.idx")
+
+    def sources(self, sheet_names):
+        base_dir = os.path.dirname(self.config_path)
+        signatures = {self.config_path: file_signature(self.config_path)}
+        for file_name in sheet_names:
+            image_path = os.path.join(base_dir, file_name)
+            signatures[image_path] = file_signature(image_path)
+        return signatures
+
+    def load(self):
+        # Returns a Tileset, or None if there is no cache or any source file changed since it was written
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            if not data.startswith(self.MAGIC):
+                return None
+            offset = len(self.MAGIC)
+            (header_length,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            header = json.loads(data[offset:offset + header_length].decode("utf-8"))
+            offset += header_length
+            if header["version"] != self.VERSION or header["byteorder"] != sys.byteorder:
+                return None
+
+            strings = header["strings"]
+            range_files = [strings[i] for i in header["range_files"]]
+            if self.sources(range_files) != header["sources"]:
+                return None # Config or a sheet was edited, moved or deleted
+
+            columns = {}
+            for name, typecode, length in header["columns"]:
+                column = array(typecode)
+                column.frombytes(data[offset:offset + length * column.itemsize])
+                offset += length * column.itemsize
+                columns[name] = column
+        except (ValueError, KeyError, IndexError, struct.error) as e:
+            print(f"Warning: Ignoring unreadable tileset cache {self.path}: {e}")
+            return None
+
+        tileset = Tileset(None, os.path.dirname(self.config_path))
+        range_columns = zip(range_files, columns["range_start"], columns["range_end"],
+                            columns["range_width"], columns["range_height"])
+        for file_name, start_index, end_index, sprite_width, sprite_height in range_columns:
+            tileset.image_sprite_ranges.append((file_name, start_index, end_index, sprite_width, sprite_height))
+
+        tiles_data = tileset.tiles_data
+        tiles_data.sprite_indices = columns["sprite_index"]
+        tiles_data.sheet_ids = columns["sheet_id"]
+        tiles_data.layers = columns["layer"]
+        tiles_data.variants = columns["variant"]
+        tiles_data.weights = columns["weight"]
+        spans = {} # Re-share the slices of IDs that were declared together
+        for tile_id, start, end in zip(columns["tile_id"], columns["slice_start"], columns["slice_end"]):
+            tile_id = strings[tile_id]
+            span = spans.setdefault((start, end), (start, end))
+            tiles_data.slices[tile_id] = span
+            for sheet_id in set(tiles_data.sheet_ids[start:end]):
+                tileset.tiles_by_file.setdefault(range_files[sheet_id], set()).add(tile_id)
+        tiles_data.rotating = {strings[tile_id] for tile_id in columns["rotating_tile"]}
+
+        tile_graph = tileset.tile_graph
+        for tile_id, target in zip(columns["looks_like_from"], columns["looks_like_to"]):
+            tile_graph.looks_like[strings[tile_id]] = strings[target]
+        for tile_id, sub_name, sub_tile_id in zip(columns["subtile_parent"], columns["subtile_name"], columns["subtile_id"]):
+            tile_graph.subtiles.setdefault(strings[tile_id], {})[strings[sub_name]] = strings[sub_tile_id]
+        for file_name, tile_id in zip(columns["extra_file"], columns["extra_tile"]):
+            tileset.tiles_by_file.setdefault(strings[file_name], set()).add(strings[tile_id])
+        tileset.build_indexes()
+        return tileset
+
+    def save(self, tileset):
+        string_ids = {}
+        strings = []
+        def intern(text):
+            if text not in string_ids:
+                string_ids[text] = len(strings)
+                strings.append(text)
+            return string_ids[text]
+
+        columns = {name: array("q") for name in ("range_start", "range_end", "range_width", "range_height")}
+        range_files = []
+        for file_name, start_index, end_index, sprite_width, sprite_height in tileset.image_sprite_ranges:
+            range_files.append(intern(file_name))
+            columns["range_start"].append(start_index)
+            columns["range_end"].append(end_index)
+            columns["range_width"].append(sprite_width)
+            columns["range_height"].append(sprite_height)
+
+        tiles_data = tileset.tiles_data
+        columns["sprite_index"] = tiles_data.sprite_indices
+        columns["sheet_id"] = tiles_data.sheet_ids
+        columns["layer"] = tiles_data.layers
+        columns["variant"] = tiles_data.variants
+        columns["weight"] = tiles_data.weights
+        columns["tile_id"] = array("i")
+        columns["slice_start"] = array("q")
+        columns["slice_end"] = array("q")
+        for tile_id, (start, end) in tiles_data.slices.items():
+            columns["tile_id"].append(intern(tile_id))
+            columns["slice_start"].append(start)
+            columns["slice_end"].append(end)
+        columns["rotating_tile"] = array("i", (intern(tile_id) for tile_id in tiles_data.rotating))
+
+        tile_graph = tileset.tile_graph
+        columns["looks_like_from"] = array("i", (intern(tile_id) for tile_id in tile_graph.looks_like))
+        columns["looks_like_to"] = array("i", (intern(target) for target in tile_graph.looks_like.values()))
+        for name in ("subtile_parent", "subtile_name", "subtile_id", "extra_file", "extra_tile"):
+            columns[name] = array("i")
+        for tile_id, subtiles in tile_graph.subtiles.items():
+            for sub_name, sub_tile_id in subtiles.items():
+                columns["subtile_parent"].append(intern(tile_id))
+                columns["subtile_name"].append(intern(sub_name))
+                columns["subtile_id"].append(intern(sub_tile_id))
+        # looks_like-only tiles are listed under their declaring file without owning any sprite there
+        for file_name, tile_ids in tileset.tiles_by_file.items():
+            for tile_id in tile_ids:
+                if tile_id not in tiles_data:
+                    columns["extra_file"].append(intern(file_name))
+                    columns["extra_tile"].append(intern(tile_id))
+
+        header = json.dumps({
+            "version": self.VERSION,
+            "byteorder": sys.byteorder,
+            "sources": self.sources(strings[i] for i in range_files),
+            "strings": strings,
+            "range_files": range_files,
+            "columns": [(name, column.typecode, len(column)) for name, column in columns.items()],
+        }).encode("utf-8")
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(self.MAGIC)
+                f.write(struct.pack("<I", len(header)))
+                f.write(header)
+                for column in columns.values():
+                    f.write(column.tobytes())
+            os.replace(temp_path, self.path) # Never leave a half-written cache behind
+        except OSError as e:
+            print(f"Warning: Could not write tileset cache {self.path}: {e}")
+
+def load_tileset(config_path, progress=None, cancel_event=None, on_tile_set=None):
+    # Parsed Tileset for config_path, from the compiled cache when nothing changed since it was written.
+    # Otherwise tile_config.json is streamed; see Tileset.parse_stream for on_tile_set.
+    def report(message):
+        if progress is not None:
+            progress(0, 0, message)
+
+    # An unchanged pack is rebuilt from the compiled cache without reading tile_config.json
+    report("Checking tileset cache")
+    cache = TilesetCache(config_path)
+    with perf_stats.timer("cache load"):
+        tileset = cache.load()
+    if tileset is None:
+        report("Reading tile_config.json")
+        tileset = Tileset(None, os.path.dirname(config_path))
+        with perf_stats.timer("parse"):
+            with open(config_path, 'r') as f:
+                tileset.parse_stream(f, progress=progress, cancel_event=cancel_event, on_tile_set=on_tile_set)
+        with perf_stats.timer("cache save"):
+            cache.save(tileset)
+    tileset.config_path = config_path
+    return tileset
+
+class SpriteReportLoader:
+    # Decodes and hashes every sheet for the sprite report on a worker thread, through its own one-sheet cache.
+    # Works on a copy of the tileset's ranges and references, taken on the Tk thread.
+    # Posts ("done", report text) or ("error", exception) to self.messages.
+    def __init__(self, tileset):
+        self.base_dir = tileset.base_dir
+        self.sprite_ranges = list(tileset.image_sprite_ranges)
+        self.referenced = set(tileset.ids_by_sprite)
+        self.messages = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        try:
+            usage = sprite_usage(self.base_dir, self.sprite_ranges, self.referenced, SheetCache(0))
+            self.messages.put(("done", sprite_usage_report(usage)))
+        except Exception as e:
+            self.messages.put(("error", e))
+
+class TilesetLoader:
+    # Reads and parses a tile_config.json on a worker thread.
+    # Results are posted to self.messages for the Tk thread to poll:
+    # ("progress", done, total, message), ("partial", sorted_tiles_by_file) and ("snapshot", tileset) while the config
+    # is still being streamed, then ("done", tileset), ("error", exception) or ("cancelled",).
+    # The Tileset is only handed over once done: until then this thread is still filling it in, and the Tk thread
+    # draws from the frozen copies in the snapshot messages.
+    def __init__(self, config_path):
+        self.config_path = config_path
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.snapshot_taken = threading.Event() # Set by the Tk thread once it has the last snapshot
+        self.snapshot_taken.set()
+        self.next_snapshot = 0 # perf_counter time before which no new snapshot is made
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def report_progress(self, done, total, message):
+        self.messages.put(("progress", done, total, message))
+
+    def report_tile_set(self, tileset, sorted_tiles_by_file):
+        # Only the freshly built ID lists and frozen copies go out, never the tileset they came from.
+        # A new copy is only made once the previous one was picked up, and spaced out so copies cost at most
+        # SNAPSHOT_SHARE of the load.
+        self.messages.put(("partial", {file_name: tuple(tile_ids) for file_name, tile_ids in sorted_tiles_by_file.items()}))
+        start = time.perf_counter()
+        if self.snapshot_taken.is_set() and start >= self.next_snapshot:
+            self.snapshot_taken.clear()
+            self.messages.put(("snapshot", tileset.snapshot()))
+            end = time.perf_counter()
+            self.next_snapshot = end + (end - start) * (1 - SNAPSHOT_SHARE) / SNAPSHOT_SHARE
+
+    def run(self):
+        try:
+            with perf_stats.timer("load"):
+                tileset = load_tileset(self.config_path, progress=self.report_progress, cancel_event=self.cancel_event,
+                                       on_tile_set=self.report_tile_set)
+            self.messages.put(("done", tileset))
+        except LoadCancelled:
+            self.messages.put(("cancelled",))
+        except Exception as e:
+            self.messages.put(("error", e))
+
+def declared_tile_ids(tile_ids, tile_entry):
+    # Tile IDs an entry defines, including the "parent:sub" IDs of its multitile sub-entries
+    declared = set(tile_ids)
+    if tile_entry.get("multitile"):
+        for sub_entry in additional_tiles(tile_entry):
+            sub_name = sub_entry.get("id")
+            if sub_name and isinstance(sub_name, str):
+                declared |= declared_tile_ids([subtile_id(tile_id, sub_name) for tile_id in tile_ids], sub_entry)
+    return declared
+
+def summarize_tile_sets(config_path, previous=None):
+    # Streams a tile_config.json into (tile_info, summaries, edited) for TilesetWatcher. summaries has one
+    # (file, sprite_width, sprite_height, digest of the source text, declared tile IDs) per tile set with a file.
+    # edited maps positions whose digest differs from the previous summaries to the parsed tile set.
+    tile_info = None
+    summaries = []
+    edited = {}
+    with open(config_path, "r") as f:
+        reader = JsonStreamReader(f)
+        for key, value in iter_tile_config(reader):
+            if key == "tile_info":
+                tile_info = value
+            if key != "tiles-new" or not value.get("file"):
+                continue
+            digest = hashlib.blake2b(reader.last_text().encode("utf-8"), digest_size=16).digest()
+            tile_ids = set()
+            for tile_entry in value.get("tiles", []):
+                entry_ids = tile_entry.get("id")
+                if entry_ids:
+                    tile_ids |= declared_tile_ids(entry_ids if isinstance(entry_ids, list) else [entry_ids], tile_entry)
+            position = len(summaries)
+            if previous is not None and (position >= len(previous) or previous[position][3] != digest):
+                edited[position] = value
+            summaries.append((value["file"], value.get("sprite_width"), value.get("sprite_height"), digest, tile_ids))
+    return tile_info, summaries, edited
+
+class TilesetWatcher:
+    # Polls the config and sheets of a loaded tileset for edits on a background thread.
+    # Posts to self.messages for the Tk thread:
+    # ("sheets", [file_name, ...]) when sheets were repainted without changing their sprite count,
+    # ("tile_sets", tile_ids, tile_sets) when only some tile sets were edited (see Tileset.replace_tile_sets),
+    # or ("reload",) when sprite ranges moved and the whole pack has to be parsed again.
+    def __init__(self, tileset, interval=WATCH_INTERVAL):
+        self.config_path = tileset.config_path
+        self.base_dir = tileset.base_dir
+        self.ranges = list(tileset.image_sprite_ranges)
+        self.interval = interval
+        self.messages = queue.Queue()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def signatures(self):
+        paths = [self.config_path] + [os.path.join(self.base_dir, sprite_range[0]) for sprite_range in self.ranges]
+        return {path: file_signature(path) for path in paths}
+
+    def run(self):
+        signatures = self.signatures()
+        try:
+            tile_info, summaries, _ = summarize_tile_sets(self.config_path)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Watching {self.config_path} without tile set diffs: {e}")
+            tile_info, summaries = None, None
+        while not self.stop_event.wait(self.interval):
+            current = self.signatures()
+            changed = {path for path in current if current[path] != signatures.get(path)}
+            if not changed:
+                continue
+            signatures = current
+
+            if self.config_path in changed:
+                if summaries is None:
+                    self.messages.put(("reload",))
+                    return
+                try:
+                    new_tile_info, new_summaries, edited = summarize_tile_sets(self.config_path, summaries)
+                except (OSError, ValueError) as e:
+                    print(f"Warning: Not reloading {self.config_path}: {e}")
+                    continue # Probably half-saved or mistyped; the next save is picked up again
+                tile_ids = self.edited_tile_ids(summaries, new_summaries, edited)
+                if new_tile_info != tile_info or tile_ids is None:
+                    self.messages.put(("reload",))
+                    return
+                tile_info, summaries = new_tile_info, new_summaries
+                if edited:
+                    self.messages.put(("tile_sets", tile_ids, [edited[position] for position in sorted(edited)]))
+
+            repainted = []
+            for file_name, start_index, end_index, sprite_width, sprite_height in self.ranges:
+                if os.path.join(self.base_dir, file_name) not in changed:
+                    continue
+                try:
+                    image_width, image_height = probe_sheet_size(os.path.join(self.base_dir, file_name))
+                except Exception:
+                    image_width = image_height = 0 # Deleted or unreadable
+                sprites_in_image = (image_width // sprite_width) * (image_height // sprite_height) if sprite_width else 0
+                if sprites_in_image != end_index - start_index + 1:
+                    self.messages.put(("reload",)) # Every later sheet's sprite indices move
+                    return
+                repainted.append(file_name)
+            if repainted:
+                self.messages.put(("sheets", repainted))
+
+    def edited_tile_ids(self, summaries, new_summaries, edited):
+        # Tile IDs to drop and re-parse for the edited tile sets, or None if that can't be done in place:
+        # sheets were added, removed or resized, or an edited ID is also declared by an untouched tile set
+        if len(new_summaries) != len(summaries):
+            return None
+        tile_ids = set()
+        for position in edited:
+            if summaries[position][:3] != new_summaries[position][:3]:
+                return None
+            tile_ids |= summaries[position][4] | new_summaries[position][4]
+        for position, summary in enumerate(new_summaries):
+            if position not in edited and not tile_ids.isdisjoint(summary[4]):
+                return None
+        return tile_ids
+
+def compile_tileset_cache(config_path):
+    # Worker process side of PackSetLoader: parse the pack once so the compiled cache is up to date
+    load_tileset(config_path)
+    return config_path
+
+class PackSet:
+    # Several packs opened side by side, with a merged index of the tile IDs each of them can draw
+    def __init__(self, names, tilesets):
+        self.names = names
+        self.tilesets = tilesets
+        self.drawable = [] # Per pack: set of tile IDs it can draw, with its own sprites or through looks_like
+        for tileset in tilesets:
+            candidates = tileset.tiles_data.slices.keys() | tileset.tile_graph.looks_like.keys()
+            self.drawable.append({tile_id for tile_id in candidates if tileset.resolve(tile_id) is not None})
+        self.all_tile_ids = set().union(*self.drawable)
+
+        # The tree lists the first pack's sheets, plus one group for what only the other packs have
+        self.tiles_by_file = dict(tilesets[0].tiles_by_file)
+        only_in_others = self.missing(0)
+        if only_in_others:
+            self.tiles_by_file[f"(missing in {names[0]})"] = only_in_others
+        self.sorted_tiles_by_file = {file_name: sorted(tile_ids, key=lambda tile_id: (tile_id.lower(), tile_id))
+                                     for file_name, tile_ids in self.tiles_by_file.items()}
+        self.search_index = TileSearchIndex(self.tiles_by_file)
+
+    def missing(self, position):
+        # Tile IDs that some other pack can draw but the pack at position can't
+        return self.all_tile_ids - self.drawable[position]
+
+    def coverage_report(self):
+        lines = [f"{len(self.all_tile_ids)} tile IDs across {len(self.names)} packs"]
+        for position, name in enumerate(self.names):
+            missing = sorted(self.missing(position), key=lambda tile_id: (tile_id.lower(), tile_id))
+            lines.append("")
+            lines.append(f"Missing in {name}: {len(missing)}")
+            lines.extend(f"  {tile_id}" for tile_id in missing)
+        return "\n".join(lines)
+
+class PackSetLoader:
+    # Loads several packs for comparison. Packs with an up-to-date compiled cache are read right here; when more
+    # than one has to be parsed, they are parsed in parallel worker processes, which leave caches behind to read.
+    # Posts the same messages as TilesetLoader, with ("done", pack_set).
+    def __init__(self, config_paths, names):
+        self.config_paths = config_paths
+        self.names = names
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            total = len(self.config_paths)
+            name_by_path = dict(zip(self.config_paths, self.names))
+            done = 0
+            tilesets = {}
+            for config_path in self.config_paths:
+                if self.cancel_event.is_set():
+                    raise LoadCancelled()
+                tileset = TilesetCache(config_path).load()
+                if tileset is not None:
+                    tileset.config_path = config_path
+                    tilesets[config_path] = tileset
+                    done += 1
+                    self.messages.put(("progress", done, total + 1, f"Read {name_by_path[config_path]} from cache"))
+
+            uncached = [config_path for config_path in self.config_paths if config_path not in tilesets]
+            if len(uncached) > 1:
+                # Spawned rather than forked: the Tk process has other threads running
+                context = multiprocessing.get_context("spawn")
+                with context.Pool(min(len(uncached), os.cpu_count() or 1)) as pool:
+                    for config_path in pool.imap_unordered(compile_tileset_cache, uncached):
+                        if self.cancel_event.is_set():
+                            raise LoadCancelled()
+                        done += 1
+                        self.messages.put(("progress", done, total + 1, f"Parsed {name_by_path[config_path]}"))
+
+            self.messages.put(("progress", total, total + 1, "Building cross-pack index"))
+            for config_path in uncached:
+                # Cache hits after the pool, unless a cache couldn't be written; a single uncached pack is parsed here
+                tilesets[config_path] = load_tileset(config_path, cancel_event=self.cancel_event)
+            self.messages.put(("done", PackSet(self.names, [tilesets[config_path] for config_path in self.config_paths])))
+        except LoadCancelled:
+            self.messages.put(("cancelled",))
+        except Exception as e:
+            self.messages.put(("error", e))
+
+class MapPreviewWindow(tk.Toplevel):
+    # Pannable, zoomable MapPreview of a tileset: drag or arrow keys to pan, mouse wheel to zoom
+    def __init__(self, parent, tileset, renderer):
+        super().__init__(parent)
+        self.title("Map Preview")
+        self.geometry("1024x768")
+        self.tileset = tileset
+        self.renderer = renderer
+        self.preview = None
+        self.view_x = self.view_y = 0 # Content position shown at the canvas' top-left corner
+        self.zoom_level = 1.0
+        self.drag_start = None
+        self.photo = None
+        self.render_pending = False
+        self.frame_times = deque(maxlen=FRAME_TIME_SAMPLES)
+
+        controls = tk.Frame(self)
+        controls.pack(fill=tk.X, pady=5)
+        tk.Label(controls, text="Size:").pack(side=tk.LEFT, padx=5)
+        self.width_var = tk.IntVar(value=MAP_PREVIEW_SIZE)
+        self.height_var = tk.IntVar(value=MAP_PREVIEW_SIZE)
+        tk.Spinbox(controls, from_=1, to=2000, width=5, textvariable=self.width_var).pack(side=tk.LEFT)
+        tk.Label(controls, text="x").pack(side=tk.LEFT)
+        tk.Spinbox(controls, from_=1, to=2000, width=5, textvariable=self.height_var).pack(side=tk.LEFT)
+        tk.Button(controls, text="Random Map", command=self.random_map).pack(side=tk.LEFT, padx=5)
+        tk.Button(controls, text="Load Layout...", command=self.load_layout).pack(side=tk.LEFT, padx=5)
+        self.frame_time_label = tk.Label(controls, text="", anchor=tk.W)
+        self.frame_time_label.pack(side=tk.LEFT, padx=10, fill=tk.X, expand=True)
+
+        self.canvas = tk.Canvas(self, bg="black", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.image_item = self.canvas.create_image(0, 0, anchor=tk.NW)
+
+        self.canvas.bind("<Configure>", lambda event: self.schedule_render())
+        self.canvas.bind("<ButtonPress-1>", self.on_drag_start)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Button-4>", self.on_wheel)
+        self.canvas.bind("<Button-5>", self.on_wheel)
+        for key, dx, dy in (("<Left>", -1, 0), ("<Right>", 1, 0), ("<Up>", 0, -1), ("<Down>", 0, 1)):
+            self.bind(key, lambda event, dx=dx, dy=dy: self.pan_cells(dx, dy))
+
+        self.random_map()
+
+    def set_layout(self, names, codes):
+        self.preview = MapPreview(self.tileset, self.renderer, names, codes)
+        self.preview.set_zoom(self.zoom_level)
+        self.view_x = self.view_y = 0
+        self.frame_times.clear()
+        self.schedule_render()
+
+    def random_map(self):
+        try:
+            width, height = max(1, self.width_var.get()), max(1, self.height_var.get())
+        except tk.TclError:
+            messagebox.showerror("Error", "Map size must be a whole number.", parent=self)
+            return
+        self.set_layout(*random_map_layout(self.tileset, width, height))
+
+    def load_layout(self):
+        file_path = filedialog.askopenfilename(
+            parent=self,
+            title="Select map layout",
+            filetypes=(("JSON files", "*.json"), ("All files", "*.*"))
+        )
+        if not file_path:
+            return
+        try:
+            self.set_layout(*load_map_layout(file_path))
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            messagebox.showerror("Error loading layout", str(e), parent=self)
+
+    def pan(self, dx, dy):
+        # Keep the view inside the map
+        max_x = max(self.preview.width - self.canvas.winfo_width(), 0)
+        max_y = max(self.preview.height - self.canvas.winfo_height(), 0)
+        self.view_x = min(max(self.view_x + dx, 0), max_x)
+        self.view_y = min(max(self.view_y + dy, 0), max_y)
+        self.schedule_render()
+
+    def pan_cells(self, dx, dy):
+        self.pan(dx * self.preview.scaled_width, dy * self.preview.scaled_height)
+
+    def on_drag_start(self, event):
+        self.drag_start = (event.x, event.y)
+        self.canvas.focus_set()
+
+    def on_drag(self, event):
+        if self.drag_start is None:
+            return
+        self.pan(self.drag_start[0] - event.x, self.drag_start[1] - event.y)
+        self.drag_start = (event.x, event.y)
+
+    def on_wheel(self, event):
+        # Zoom around the cursor
+        factor = 1.25 if event.num == 4 or event.delta > 0 else 0.8
+        old_zoom = self.preview.zoom_level
+        self.zoom_level = min(max(self.zoom_level * factor, 0.25), 8.0)
+        self.preview.set_zoom(self.zoom_level)
+        scale = self.preview.zoom_level / old_zoom
+        self.view_x = int((self.view_x + event.x) * scale) - event.x
+        self.view_y = int((self.view_y + event.y) * scale) - event.y
+        self.pan(0, 0)
+
+    def schedule_render(self):
+        # Coalesce pan/zoom events: however many arrive, draw once when Tk goes idle
+        if not self.render_pending:
+            self.render_pending = True
+            self.after_idle(self.render)
+
+    def render(self):
+        self.render_pending = False
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if self.preview is None or width <= 1 or height <= 1:
+            return
+        start_time = time.perf_counter()
+        with perf_stats.timer("map frame"):
+            frame = self.preview.render(self.view_x, self.view_y, width, height)
+        image = Image.fromarray(frame, "RGB")
+        if self.photo is not None and (self.photo.width(), self.photo.height()) == (width, height):
+            self.photo.paste(image) # Reuse the Tk image instead of allocating a new one every frame
+        else:
+            self.photo = ImageTk.PhotoImage(image)
+            self.canvas.itemconfigure(self.image_item, image=self.photo)
+        self.frame_times.append(time.perf_counter() - start_time)
+
+        average = sum(self.frame_times) / len(self.frame_times)
+        redrawn = self.preview.redrawn_pixels / (width * height)
+        self.frame_time_label.configure(
+            text=f"{self.preview.columns}x{self.preview.rows} cells | frame {self.frame_times[-1] * 1000:.1f} ms, "
+                 f"avg {average * 1000:.1f} ms ({1 / max(average, 1e-6):.0f} fps) | {redrawn:.0%} redrawn")
+
 class TileViewerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("CDDA Tile Viewer --- By Bzver")
 
         self.tile_config = None
-        self.tile_images = {} # This will now be used as a cache for currently displayed images
+        self.sheet_cache = SheetCache() # Decoded sprite sheets, shared across display_tile calls
+        self.tileset = Tileset(None, None) # The loaded pack; its fields are mirrored onto the attributes above
+        self.renderer = TileRenderer(self.tileset, self.sheet_cache) # bg/fg compositing, cached per tile variant
+        self.scaled_cache = ScaledSpriteCache() # Scaled sprites and their PhotoImages, per zoom bucket
+        self.zoom_render_pending = False # True while a coalesced zoom redraw is scheduled
+        self.loader = None # TilesetLoader or PackSetLoader currently running, if any
+        self.partial_loader = None # Loader whose sheets are being listed before it is done; tiles are drawn from its snapshots meanwhile
+        self.awaiting_snapshot = False # True while the tile or sheet shown is waiting for a snapshot that has it
+        self.sprite_report_loader = None # SpriteReportLoader currently running, if any
+        self.pack_set = None # PackSet being compared, or None when a single pack is loaded
+        self.pack_renderers = [] # One TileRenderer per pack of pack_set, all sharing sheet_cache
+        self.watcher = None # TilesetWatcher of the loaded pack while auto reload is on
+        self.current_sheet = None # File name shown as a contact sheet, when a file node is selected
+        self.contact_sheet = None # ContactSheet for current_sheet at the current zoom
+        self.sheet_render_pending = False # True while a viewport redraw is scheduled
         self.tiles_data = {} # Stores parsed tile data keyed by tile_id
         self.tiles_by_file = {} # Stores tile_ids grouped by file_name
+        self.sorted_tiles_by_file = {} # Same as tiles_by_file, as sorted lists computed once per parse
+        self.search_index = TileSearchIndex({}) # Built once per parse
+        self.last_search = None # (search_term, positions) of the last query, for incremental narrowing
+        self.search_after_id = None # Pending debounced search-as-you-type callback
+        self.file_nodes = {} # file_name -> tree node, kept across searches
+        self.node_tile_ids = {} # file node -> tile IDs it should currently show
+        self.node_items = {} # file node -> {tile_id: child item} for nodes that have been opened
+        self.pending_tree_children = {} # file node -> tile IDs not yet inserted under it
+        self.node_generation = {} # file node -> counter bumped whenever its children change, so stale chunked inserts stop
         self.displayed_photos = [] # List to hold PhotoImage references
-        self.image_sprite_ranges = [] # To store (file_name, start_index, end_index, sprite_width, sprite_height)
+        self.image_sprite_ranges = SpriteRangeIndex() # (file_name, start_index, end_index, sprite_width, sprite_height), searchable by sprite index
         self.base_dir = None # Store the base directory of the config file
         self.zoom_level = 1.0 # Initial zoom level
         self.current_tile_id = None # Store the currently displayed tile ID
+        self.current_displayed_image = None # Combined image of the displayed tile, used by extract_tile
+        self.variant_boxes = [] # Where display_tile drew each variant
 
         # GUI Elements
         self.button_frame = tk.Frame(root)
@@ -90,6 +2386,27 @@ class TileViewerApp:
         self.load_button = tk.Button(self.button_frame, text="Load tile_config.json", command=self.load_config)
         self.load_button.pack(side=tk.LEFT, padx=5)
 
+        self.compare_button = tk.Button(self.button_frame, text="Compare Packs", command=self.compare_packs)
+        self.compare_button.pack(side=tk.LEFT, padx=5)
+
+        self.coverage_button = tk.Button(self.button_frame, text="Coverage Report", command=self.show_coverage_report, state=tk.DISABLED)
+        self.coverage_button.pack(side=tk.LEFT, padx=5)
+
+        self.watch_var = tk.BooleanVar(value=True)
+        self.watch_check = tk.Checkbutton(self.button_frame, text="Auto Reload", variable=self.watch_var, command=self.toggle_watching)
+        self.watch_check.pack(side=tk.LEFT, padx=5)
+
+        self.perf_var = tk.BooleanVar(value=False)
+        self.perf_check = tk.Checkbutton(self.button_frame, text="Show Timings", variable=self.perf_var, command=self.toggle_perf_stats)
+        self.perf_check.pack(side=tk.LEFT, padx=5)
+
+        # Frame for background load progress
+        self.status_frame = tk.Frame(root)
+        self.status_label = tk.Label(self.status_frame, text="")
+        self.status_label.pack(side=tk.LEFT, padx=5)
+        self.progress_bar = ttk.Progressbar(self.status_frame, orient=tk.HORIZONTAL, length=200, mode="determinate")
+        self.progress_bar.pack(side=tk.LEFT, padx=5)
+
 
         # Frame for zoom controls
         self.zoom_frame = tk.Frame(root)
@@ -112,6 +2429,13 @@ class TileViewerApp:
         self.extract_button = tk.Button(self.zoom_frame, text="Extract Tile", command=self.extract_tile)
         self.extract_button.pack(side=tk.LEFT, padx=5)
 
+        self.map_preview_button = tk.Button(self.zoom_frame, text="Map Preview", command=self.open_map_preview)
+        self.map_preview_button.pack(side=tk.LEFT, padx=5)
+        self.random_variant_button = tk.Button(self.zoom_frame, text="Random Variant", command=self.pick_random_variant)
+        self.random_variant_button.pack(side=tk.LEFT, padx=5)
+        self.sprite_report_button = tk.Button(self.zoom_frame, text="Sprite Report", command=self.show_sprite_report)
+        self.sprite_report_button.pack(side=tk.LEFT, padx=5)
+
         # Frame for search controls
         self.search_frame = tk.Frame(root)
         self.search_frame.pack(pady=5)
@@ -123,6 +2447,7 @@ class TileViewerApp:
         self.search_entry = tk.Entry(self.search_frame)
         self.search_entry.pack(side=tk.LEFT, padx=5)
         self.search_entry.bind("<Return>", self.search_tiles) # Bind Enter key
+        self.search_entry.bind("<KeyRelease>", self.schedule_search) # Search as you type
 
         self.search_button = tk.Button(self.search_frame, text="Search", command=self.search_tiles)
         self.search_button.pack(side=tk.LEFT, padx=5)
@@ -150,10 +2475,39 @@ class TileViewerApp:
 
         # Bind selection event
         self.tree.bind("<<TreeviewSelect>>", self.on_tile_select)
-
-        # Canvas for displaying the selected tile
-        self.canvas = tk.Canvas(self.main_frame, bg="gray")
-        self.canvas.pack(side=tk.RIGHT, expand=True, fill=tk.BOTH, padx=10)
+        self.tree.bind("<<TreeviewOpen>>", self.on_tree_open)
+
+        # Canvas for displaying the selected tile, or the whole sheet when a file node is selected
+        self.canvas_frame = tk.Frame(self.main_frame)
+        self.canvas_frame.pack(side=tk.RIGHT, expand=True, fill=tk.BOTH, padx=10)
+
+        self.canvas_yscrollbar = ttk.Scrollbar(self.canvas_frame, orient=tk.VERTICAL, command=self.on_canvas_yview)
+        self.canvas_yscrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas_xscrollbar = ttk.Scrollbar(self.canvas_frame, orient=tk.HORIZONTAL, command=self.on_canvas_xview)
+        self.canvas_xscrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+
+        self.canvas = tk.Canvas(self.canvas_frame, bg="gray",
+                                xscrollcommand=self.canvas_xscrollbar.set, yscrollcommand=self.canvas_yscrollbar.set)
+        self.canvas.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        self.canvas.bind("<Configure>", self.on_canvas_configure)
+        self.canvas.bind("<MouseWheel>", self.on_canvas_wheel)
+        self.canvas.bind("<Button-4>", self.on_canvas_wheel)
+        self.canvas.bind("<Button-5>", self.on_canvas_wheel)
+        self.canvas.bind("<Double-Button-1>", self.on_canvas_double_click)
+
+        # Timings bar along the bottom, toggled with "Show Timings" or F12
+        self.perf_frame = tk.Frame(root)
+        self.perf_label = tk.Label(self.perf_frame, text="", justify=tk.LEFT, anchor=tk.W, font="TkFixedFont")
+        self.perf_label.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.perf_save_button = tk.Button(self.perf_frame, text="Save Timings...", command=self.save_perf_stats)
+        self.perf_save_button.pack(side=tk.RIGHT, padx=5)
+        self.perf_reset_button = tk.Button(self.perf_frame, text="Reset", command=self.reset_perf_stats)
+        self.perf_reset_button.pack(side=tk.RIGHT, padx=5)
+        self.root.bind("<F12>", lambda event: (self.perf_var.set(not self.perf_var.get()), self.toggle_perf_stats()))
+
+        perf_stats.add_cache("sheets", lambda: self.sheet_cache.stats())
+        perf_stats.add_cache("composites", lambda: self.renderer.stats())
+        perf_stats.add_cache("scaled sprites", lambda: self.scaled_cache.stats())
 
         # Initially hide the main frame
         self.main_frame.pack_forget()
@@ -168,206 +2522,394 @@ class TileViewerApp:
         if not file_path:
             return
 
-        try:
-            with open(file_path, 'r') as f:
-                self.tile_config = json.load(f)
-            messagebox.showinfo("Success", "tile_config.json loaded successfully.")
-            self.base_dir = os.path.dirname(file_path) # Store base directory
-            self.parse_config()
-            self.populate_treeview()
-            self.main_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=10) # Show main frame
-            self.zoom_frame.pack(pady=5) # Show zoom frame
-            self.search_frame.pack(pady=5) # Show zoom frame
+        self.start_load(file_path, "tile_config.json loaded successfully.")
 
-        except Exception as e:
-            messagebox.showerror("Error loading config", str(e))
-            self.tile_config = None
-            self.tile_images = {}
-            self.tiles_data = {}
-            self.tiles_by_file = {}
-            self.image_sprite_ranges = []
-            self.base_dir = None
-            self.main_frame.pack_forget() # Hide main frame on error
 
-
-    def load_from_cdda(self):
+    def select_graphics_packs(self, multiple=False):
+        # Asks for the CDDA folder and then for pack(s) in its gfx folder.
+        # Returns (gfx_path, pack name or list of names), or None if cancelled or nothing was found.
         cdda_folder = filedialog.askdirectory(
             initialdir=".",
             title="Select CDDA Installation Folder"
         )
         if not cdda_folder:
-            return
+            return None
 
         gfx_path = os.path.join(cdda_folder, "gfx")
         if not os.path.isdir(gfx_path):
             messagebox.showerror("Error", f"Could not find 'gfx' folder in {cdda_folder}")
-            return
+            return None
 
         graphics_packs = [d for d in os.listdir(gfx_path) if os.path.isdir(os.path.join(gfx_path, d))]
 
         if not graphics_packs:
             messagebox.showinfo("Info", f"No graphics packs found in {gfx_path}")
-            return
+            return None
 
-        dialog = GraphicsPackSelectionDialog(self.root, graphics_packs)
-        selected_pack = dialog.show()
+        dialog = GraphicsPackSelectionDialog(self.root, graphics_packs, multiple)
+        selection = dialog.show()
+        if not selection:
+            return None
+        return gfx_path, selection
 
-        if selected_pack:
-            tile_config_path = os.path.join(gfx_path, selected_pack, "tile_config.json")
-            if not os.path.exists(tile_config_path):
-                messagebox.showerror("Error", f"Could not find tile_config.json in {os.path.join(gfx_path, selected_pack)}")
-                return
+    def pack_config_path(self, gfx_path, pack):
+        tile_config_path = os.path.join(gfx_path, pack, "tile_config.json")
+        if not os.path.exists(tile_config_path):
+            messagebox.showerror("Error", f"Could not find tile_config.json in {os.path.join(gfx_path, pack)}")
+            return None
+        return tile_config_path
 
+    def load_from_cdda(self):
+        selection = self.select_graphics_packs()
+        if not selection:
+            return
+        gfx_path, selected_pack = selection
+        tile_config_path = self.pack_config_path(gfx_path, selected_pack)
+        if tile_config_path:
             # Load the selected tile_config.json
-            try:
-                with open(tile_config_path, 'r') as f:
-                    self.tile_config = json.load(f)
-                messagebox.showinfo("Success", f"tile_config.json loaded successfully from {selected_pack}.")
-                self.base_dir = os.path.dirname(tile_config_path) # Store base directory of the loaded config
-                self.parse_config()
-                self.populate_treeview()
-                self.main_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=10) # Show main frame
-                self.zoom_frame.pack(pady=5) # Show zoom frame
-                self.search_frame.pack(pady=5) # Show search frame
-
-            except Exception as e:
-                messagebox.showerror("Error loading config", str(e))
-                self.tile_config = None
-                self.tile_images = {}
-                self.tiles_data = {}
-                self.tiles_by_file = {}
-                self.image_sprite_ranges = []
-                self.base_dir = None
-                self.main_frame.pack_forget() # Hide main frame on error
-
-
-    def parse_config(self):
-        self.tiles_data = {}
-        self.tiles_by_file = {}
-        self.tile_images = {} # Clear image cache
-        self.image_sprite_ranges = []
-        current_sprite_index = 0 # Global cumulative index
+            self.start_load(tile_config_path, f"tile_config.json loaded successfully from {selected_pack}.")
 
-        if not self.tile_config or "tiles-new" not in self.tile_config:
+    def compare_packs(self):
+        selection = self.select_graphics_packs(multiple=True)
+        if not selection:
             return
+        gfx_path, selected_packs = selection
+        config_paths = [self.pack_config_path(gfx_path, pack) for pack in selected_packs]
+        if None in config_paths:
+            return
+        self.start_loader(PackSetLoader(config_paths, selected_packs), f"Loading {len(selected_packs)} packs...",
+                          f"Comparing {', '.join(selected_packs)}.")
+
+
+    def start_load(self, config_path, success_message, reload=False):
+        self.start_loader(TilesetLoader(config_path), f"Loading {config_path}...", success_message, reload)
+
+    def start_loader(self, loader, status_text, success_message, reload=False):
+        # success_message None shows no message box. reload is an auto reload of the pack shown: its partial results
+        # are skipped and the old pack stays up until the new one is done, then the tree is diffed against it, keeping
+        # what is open, selected and searched, and the tile shown.
+        # Picking another pack mid-load cancels the previous one
+        self.stop_watching()
+        if self.loader is not None:
+            self.loader.cancel()
+        self.loader = loader
+        self.loader.start()
+
+        self.progress_bar.configure(value=0, maximum=1)
+        self.status_label.configure(text=status_text)
+        self.status_frame.pack(after=self.button_frame, pady=5) # Show status frame
+        self.root.after(LOAD_POLL_MS, self.poll_loader, self.loader, success_message, reload)
+
+    def poll_loader(self, loader, success_message, reload):
+        if loader is not self.loader:
+            return # Superseded by a newer load
+        try:
+            while True:
+                message = loader.messages.get_nowait()
+                kind = message[0]
+                if kind == "progress":
+                    _, done, total, text = message
+                    self.progress_bar.configure(value=done, maximum=max(total, 1))
+                    self.status_label.configure(text=text)
+                elif kind == "partial":
+                    if not reload:
+                        self.show_partial_tileset(loader, message[1])
+                elif kind == "snapshot":
+                    if not reload: # Left untaken, so the loader stops making them
+                        self.show_tileset_snapshot(loader, message[1])
+                elif kind == "done":
+                    self.finish_load(message[1], success_message, reload)
+                    return
+                elif kind == "error":
+                    self.fail_load(message[1])
+                    return
+                else: # cancelled
+                    return
+        except queue.Empty:
+            pass
+        self.root.after(LOAD_POLL_MS, self.poll_loader, loader, success_message, reload)
+
+    def show_partial_tileset(self, loader, sorted_tiles_by_file):
+        # While a config is streamed, each sheet is listed as soon as its tile set has been parsed.
+        # Tiles and sheets are drawn from the loader's snapshots; search, Map Preview and Sprite Report wait for the
+        # whole pack.
+        try:
+            if self.partial_loader is not loader:
+                self.partial_loader = loader
+                self.set_tileset_controls(tk.DISABLED)
+                self.contact_sheet = None
+                self.parse_config(Tileset(None, None)) # Nothing to draw until the first snapshot
+                self.sorted_tiles_by_file = {} # Only what has arrived so far, until the load finishes
+                self.populate_treeview()
+                self.show_main_frames()
+                self.display_current_tile()
+            self.sorted_tiles_by_file.update(sorted_tiles_by_file)
+            self.add_file_nodes(sorted_tiles_by_file)
+        except Exception as e:
+            self.fail_load(e)
 
-        # First pass: Determine sprite index ranges without loading images
-        for tile_set in self.tile_config.get("tiles-new", []):
-            file_name = tile_set.get("file")
-            if not file_name:
-                continue
-
-            # We need image dimensions to calculate sprite count, so we'll open it briefly
-            image_path = os.path.join(self.base_dir, file_name)
-            try:
-                # Open image just to get dimensions, don't keep it in self.tile_images yet
-                img = Image.open(image_path)
-                try:
-                    sprite_width = tile_set.get("sprite_width", self.tile_config["tile_info"][0]["width"])
-                    sprite_height = tile_set.get("sprite_height", self.tile_config["tile_info"][0]["height"])
-
-                    sprites_in_image = (img.width // sprite_width) * (img.height // sprite_height)
-                    start_index = current_sprite_index
-                    end_index = current_sprite_index + sprites_in_image - 1
-                    self.image_sprite_ranges.append((file_name, start_index, end_index, sprite_width, sprite_height))
-                    current_sprite_index = end_index + 1
-                finally:
-                    img.close() # Explicitly close the image file
-
-            except FileNotFoundError:
-                print(f"Warning: Image file not found: {image_path}")
-                # Still add a range entry so subsequent indices are correct
-                self.image_sprite_ranges.append((file_name, current_sprite_index, current_sprite_index -1, 0, 0)) # Invalid range
-            except Exception as e:
-                print(f"Warning: Could not process image {image_path} for dimensions: {e}")
-                self.image_sprite_ranges.append((file_name, current_sprite_index, current_sprite_index -1, 0, 0)) # Invalid range
+    def show_tileset_snapshot(self, loader, snapshot):
+        # Each snapshot replaces the previous one, keeping the decoded sheets; what waited for one is drawn now
+        loader.snapshot_taken.set()
+        if loader is not self.partial_loader:
+            return
+        try:
+            self.use_tileset(snapshot)
+            if self.awaiting_snapshot:
+                self.display_current_tile()
+        except Exception as e:
+            self.fail_load(e)
+
+    def set_tileset_controls(self, state):
+        # Buttons that need a fully loaded tileset
+        self.map_preview_button.configure(state=state)
+        if self.sprite_report_loader is None:
+            self.sprite_report_button.configure(state=state)
+
+    def finish_load(self, tileset, success_message, reload=False):
+        # tileset is a PackSet when the load came from compare_packs
+        self.loader = None
+        self.status_frame.pack_forget()
+        streamed = self.partial_loader is not None
+        self.partial_loader = None
+        self.set_tileset_controls(tk.NORMAL)
+        try:
+            if isinstance(tileset, PackSet):
+                self.show_pack_set(tileset)
+                messagebox.showinfo("Success", success_message)
+                return
+            self.parse_config(tileset, same_pack=streamed)
+            if streamed:
+                # Keep the nodes already listed (and what is open or selected in them); add what came late
+                self.add_file_nodes(self.sorted_tiles_by_file)
+                self.last_search = None
+                self.search_tiles() # The search index only exists now
+                self.display_current_tile()
+            elif reload:
+                self.refresh_tiles()
+            else:
+                self.populate_treeview()
+                self.show_main_frames()
+            self.start_watching()
+            if success_message:
+                messagebox.showinfo("Success", success_message)
+        except Exception as e:
+            self.fail_load(e)
 
+    def start_watching(self):
+        self.stop_watching()
+        if not self.watch_var.get() or self.pack_set is not None or self.tileset.config_path is None:
+            return
+        self.watcher = TilesetWatcher(self.tileset)
+        self.watcher.start()
+        self.root.after(LOAD_POLL_MS, self.poll_watcher, self.watcher)
+
+    def stop_watching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def toggle_watching(self):
+        if self.watch_var.get():
+            self.start_watching()
+        else:
+            self.stop_watching()
 
-        # Second pass: Parse tile data using global sprite indices
-        for tile_set in self.tile_config.get("tiles-new", []):
-             file_name = tile_set.get("file")
-             if not file_name:
-                 continue
-
-             if "tiles" in tile_set:
-                for tile_entry in tile_set.get("tiles", []):
-                    tile_ids = tile_entry.get("id")
-                    if not tile_ids:
-                        continue
+    def poll_watcher(self, watcher):
+        if watcher is not self.watcher:
+            return # Stopped, or replaced after a reload
+        try:
+            while True:
+                message = watcher.messages.get_nowait()
+                kind = message[0]
+                if kind == "sheets":
+                    # Only the repainted sheets are decoded again; sprite ranges and tiles are unchanged
+                    for file_name in message[1]:
+                        self.sheet_cache.discard(os.path.join(self.base_dir, file_name))
+                    self.refresh_display()
+                elif kind == "tile_sets":
+                    self.tileset.replace_tile_sets(message[1], message[2])
+                    self.refresh_tiles()
+                else: # reload
+                    self.start_load(self.tileset.config_path, None, reload=True)
+                    return
+        except queue.Empty:
+            pass
+        except Exception as e:
+            print(f"Warning: Auto reload failed: {e}")
+        self.root.after(LOAD_POLL_MS, self.poll_watcher, watcher)
 
-                    if not isinstance(tile_ids, list):
-                        tile_ids = [tile_ids]
-
-                    fg_sprites_raw = tile_entry.get("fg")
-
-                    if fg_sprites_raw is not None:
-                        fg_list = []
-                        if isinstance(fg_sprites_raw, list):
-                            for item in fg_sprites_raw:
-                                if isinstance(item, int):
-                                    fg_list.append({"sprite": item})
-                                elif isinstance(item, dict):
-                                    fg_list.append(item)
-                                else:
-                                    print(f"Warning: Unexpected type in fg list: {type(item)}")
-                        elif isinstance(fg_sprites_raw, int):
-                            fg_list = [{"sprite": fg_sprites_raw}]
-
-                        for fg_entry in fg_list:
-                            global_sprite_index = fg_entry.get("sprite")
-                            if global_sprite_index is not None:
-                                # Find which image this global index belongs to
-                                found_image_info = None
-                                for range_file_name, start, end, sprite_width, sprite_height in self.image_sprite_ranges:
-                                    if start <= global_sprite_index <= end:
-                                        found_image_info = (range_file_name, start, sprite_width, sprite_height) # Include start index
-                                        break
-
-                                if found_image_info:
-                                    range_file_name, start_index, sprite_width, sprite_height = found_image_info
-
-                                    # Calculate local sprite index within the image
-                                    local_sprite_index = global_sprite_index - (start_index - 1)
-
-                                    # Store all necessary info to crop later
-                                    for tile_id in tile_ids:
-                                        if tile_id not in self.tiles_data:
-                                            self.tiles_data[tile_id] = []
-                                        self.tiles_data[tile_id].append({
-                                            "image": range_file_name, # Use the file name from the range info
-                                            "global_sprite_index": global_sprite_index, # Store global index
-                                            "sprite_width": sprite_width,
-                                            "sprite_height": sprite_height,
-                                            "type": "fg"
-                                        })
-                                        # Populate tiles_by_file
-                                        if range_file_name not in self.tiles_by_file:
-                                            self.tiles_by_file[range_file_name] = set() # Use a set to avoid duplicate tile IDs per file
-                                        self.tiles_by_file[range_file_name].add(tile_id)
-
-                                else:
-                                    print(f"Warning: Global sprite index {global_sprite_index} is outside of any defined image range.")
+    def refresh_display(self):
+        # Redraw the tile or sheet shown from freshly composited sprites
+        self.renderer.clear()
+        self.scaled_cache.clear()
+        self.display_current_tile()
 
+    def refresh_tiles(self):
+        # The tileset changed in place or was reloaded: diff the tree against its new lists, keeping what is open,
+        # selected and searched
+        self.sorted_tiles_by_file = self.tileset.sorted_tiles_by_file
+        self.search_index = self.tileset.search_index
+        for file_name in self.sorted_tiles_by_file:
+            if file_name not in self.file_nodes:
+                self.file_nodes[file_name] = self.tree.insert("", "end", text=file_name, open=False)
+        # Config order first, so update_treeview moves new sheets into place; sheets that are gone end up detached
+        self.file_nodes = {**{file_name: self.file_nodes[file_name] for file_name in self.sorted_tiles_by_file}, **self.file_nodes}
+        self.last_search = None
+        self.search_tiles()
+        self.refresh_display()
+
+    def show_pack_set(self, pack_set):
+        # The first pack drives the sheet list and contact sheets; tiles are drawn once per pack
+        self.parse_config(pack_set.tilesets[0])
+        self.pack_set = pack_set
+        self.pack_renderers = [self.renderer] + [TileRenderer(tileset, self.sheet_cache) for tileset in pack_set.tilesets[1:]]
+        self.sorted_tiles_by_file = pack_set.sorted_tiles_by_file
+        self.search_index = pack_set.search_index
+        self.coverage_button.configure(state=tk.NORMAL)
+        self.populate_treeview()
+        self.show_main_frames()
+
+    def show_coverage_report(self):
+        if self.pack_set is None:
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Coverage Report")
+        text = tk.Text(window, wrap=tk.NONE, width=60, height=30)
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=text.yview)
+        text.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        text.insert(tk.END, self.pack_set.coverage_report())
+        text.configure(state=tk.DISABLED)
+
+    def show_main_frames(self):
+        self.main_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=10) # Show main frame
+        self.zoom_frame.pack(pady=5) # Show zoom frame
+        self.search_frame.pack(pady=5) # Show search frame
+
+    def fail_load(self, error):
+        self.loader = None
+        self.partial_loader = None
+        self.set_tileset_controls(tk.NORMAL)
+        self.stop_watching()
+        self.status_frame.pack_forget()
+        messagebox.showerror("Error loading config", str(error))
+        self.tile_config = None
+        self.pack_set = None
+        self.pack_renderers = []
+        self.coverage_button.configure(state=tk.DISABLED)
+        self.tiles_data = {}
+        self.tiles_by_file = {}
+        self.sorted_tiles_by_file = {}
+        self.image_sprite_ranges = SpriteRangeIndex()
+        self.base_dir = None
+        self.main_frame.pack_forget() # Hide main frame on error
+
+
+    def parse_config(self, tileset, same_pack=False):
+        # tileset is a Tileset already parsed by a background loader.
+        # same_pack keeps the decoded sheets, for the tileset a streamed load ends with.
+        if self.sprite_report_loader is not None:
+            self.end_sprite_report() # Its report would be about the previous pack
+        self.pack_set = None
+        self.pack_renderers = []
+        self.coverage_button.configure(state=tk.DISABLED)
+        if not same_pack:
+            self.sheet_cache.clear() # Sheets may belong to a different pack now
+            self.scaled_cache.clear()
+        self.use_tileset(tileset)
+        self.sorted_tiles_by_file = tileset.sorted_tiles_by_file
+        self.search_index = tileset.search_index
+        self.last_search = None
+
+    def use_tileset(self, tileset):
+        # Draw from tileset from now on
+        self.tileset = tileset
+        self.tile_config = tileset.tile_config
+        self.base_dir = tileset.base_dir
+        self.tiles_data = tileset.tiles_data
+        self.tiles_by_file = tileset.tiles_by_file
+        self.image_sprite_ranges = tileset.image_sprite_ranges
+        self.renderer = TileRenderer(tileset, self.sheet_cache)
 
     def populate_treeview(self, tiles_to_display=None):
+        # tiles_to_display maps file_name -> sorted list of tile IDs
         # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        # Determine which tiles to display
-        if tiles_to_display is None:
-            tiles_data = self.tiles_by_file
-        else:
-            tiles_data = tiles_to_display
+        self.tree.delete(*self.tree.get_children())
+        self.file_nodes = {}
+        self.node_tile_ids = {}
+        self.node_items = {}
+        self.pending_tree_children = {}
+        self.node_generation = {}
+
+        # Only file nodes are inserted now; children are added when a node is opened
+        for file_name in self.sorted_tiles_by_file:
+            self.file_nodes[file_name] = self.tree.insert("", "end", text=file_name, open=False)
+        self.update_treeview(self.sorted_tiles_by_file if tiles_to_display is None else tiles_to_display)
+
+    def add_file_nodes(self, tiles_by_file):
+        # Lists sheets that aren't in the tree yet and refreshes the children of those that are
+        for file_name, tile_ids in tiles_by_file.items():
+            if file_name not in self.file_nodes:
+                self.file_nodes[file_name] = self.tree.insert("", "end", text=file_name, open=False)
+            self.set_node_children(self.file_nodes[file_name], tile_ids)
+
+    def update_treeview(self, tiles_to_display):
+        # Diff the existing tree against tiles_to_display instead of rebuilding it
+        position = 0
+        for file_name, file_node in self.file_nodes.items():
+            tile_ids = tiles_to_display.get(file_name)
+            if not tile_ids:
+                self.tree.detach(file_node)
+                continue
+            self.tree.move(file_node, "", position)
+            position += 1
+            self.set_node_children(file_node, tile_ids)
 
-        # Populate the treeview
-        for file_name, tile_ids in tiles_data.items():
-            # Insert the file name as a parent node
-            file_node = self.tree.insert("", "end", text=file_name, open=False)
-            # Insert tile IDs as children under the file node
-            for tile_id in sorted(list(tile_ids)): # Sort tile IDs alphabetically
-                self.tree.insert(file_node, "end", text=tile_id, values=(tile_id,))
+    def set_node_children(self, file_node, tile_ids):
+        if self.node_tile_ids.get(file_node) is tile_ids:
+            return
+        self.node_tile_ids[file_node] = tile_ids
+        self.node_generation[file_node] = self.node_generation.get(file_node, 0) + 1
+
+        items = self.node_items.get(file_node)
+        if items is None:
+            # Not opened yet: just swap the list that will be inserted on open
+            if file_node not in self.pending_tree_children:
+                self.tree.insert(file_node, "end", text="", tags=("placeholder",)) # Makes the node expandable
+            self.pending_tree_children[file_node] = tile_ids
+            return
 
+        # Opened: drop children that no longer match, then fill in the missing ones
+        wanted = set(tile_ids)
+        stale = [tile_id for tile_id in items if tile_id not in wanted]
+        if stale:
+            self.tree.delete(*(items.pop(tile_id) for tile_id in stale))
+        self.insert_tree_chunk(file_node, tile_ids, 0, self.node_generation[file_node])
+
+    def on_tree_open(self, event):
+        file_node = self.tree.focus()
+        tile_ids = self.pending_tree_children.pop(file_node, None)
+        if tile_ids is None:
+            return
+        self.tree.delete(*self.tree.get_children(file_node)) # Remove the placeholder
+        self.node_items[file_node] = {}
+        self.insert_tree_chunk(file_node, tile_ids, 0, self.node_generation[file_node])
+
+    def insert_tree_chunk(self, file_node, tile_ids, start, generation):
+        if self.node_generation.get(file_node) != generation:
+            return # The node's children changed since this insert was scheduled
+        items = self.node_items[file_node]
+        end = min(start + TREE_CHUNK_SIZE, len(tile_ids))
+        for index in range(start, end):
+            tile_id = tile_ids[index]
+            if tile_id not in items:
+                # Children present so far are exactly tile_ids[:index], so index is the sorted position
+                items[tile_id] = self.tree.insert(file_node, index, text=tile_id, values=(tile_id,))
+        if end < len(tile_ids):
+            # Yield to the mainloop between chunks so the UI stays responsive
+            self.root.after(1, self.insert_tree_chunk, file_node, tile_ids, end, generation)
 
     def on_tile_select(self, event):
         selected_items = self.tree.selection()
@@ -379,12 +2921,22 @@ class TileViewerApp:
         item_text = self.tree.item(selected_item, "text")
         parent_item = self.tree.parent(selected_item)
 
+        if "placeholder" in self.tree.item(selected_item, "tags"):
+            return
+
         if parent_item: # It's a tile ID (child node)
             tile_id_to_display = item_text
             self.current_tile_id = tile_id_to_display # Store the current tile ID
+            self.current_sheet = None
+            self.canvas.xview_moveto(0)
+            self.canvas.yview_moveto(0)
+            self.display_current_tile()
+        else: # It's a file name (parent node): show the whole sheet
+            self.current_tile_id = None
+            self.current_sheet = item_text
+            self.canvas.xview_moveto(0)
+            self.canvas.yview_moveto(0)
             self.display_current_tile()
-        # else: # It's a file name (parent node) - could implement displaying all tiles in a file here if needed
-            # pass
 
     def zoom_in(self):
         self.zoom_level *= 1.25 # Increase zoom by 25%
@@ -397,8 +2949,176 @@ class TileViewerApp:
         self.display_current_tile()
 
     def display_current_tile(self):
+        # While streaming, a tile or sheet the latest snapshot doesn't have yet waits for one that does
+        self.awaiting_snapshot = self.partial_loader is not None and bool(
+            (self.current_tile_id and self.tileset.resolve(self.current_tile_id) is None)
+            or (not self.current_tile_id and self.current_sheet and not self.image_sprite_ranges.for_file(self.current_sheet)))
+        if self.awaiting_snapshot:
+            self.canvas.delete("all")
+            self.variant_boxes = []
+            self.contact_sheet = None
+            self.displayed_photos = []
+            self.current_displayed_image = None
+            self.canvas.configure(scrollregion=(0, 0, 0, 0))
+            self.canvas.create_text(10, 10, text="Still loading, this will be shown once its tile set has been read.", anchor=tk.NW)
+            return
         if self.current_tile_id:
-            self.display_tile(self.current_tile_id)
+            with perf_stats.timer("display tile"):
+                self.display_tile(self.current_tile_id)
+        elif self.current_sheet:
+            with perf_stats.timer("display sheet"):
+                self.display_sheet(self.current_sheet)
+
+    def display_sheet(self, file_name):
+        self.canvas.delete("all")
+        self.displayed_photos = []
+        self.current_displayed_image = None
+        self.contact_sheet = None
+
+        sprite_range = self.image_sprite_ranges.for_file(file_name)
+        if not sprite_range or sprite_range[3] <= 0:
+            self.canvas.create_text(10, 10, text=f"Sheet '{file_name}' could not be read.", anchor=tk.NW)
+            return
+        _, start_index, _, sprite_width, sprite_height = sprite_range
+        image_path = os.path.join(self.base_dir, file_name)
+        try:
+            atlas = self.sheet_cache.get(image_path, sprite_width, sprite_height)
+        except Exception as e:
+            self.canvas.create_text(10, 10, text=f"Error loading image {image_path}: {e}", anchor=tk.NW)
+            return
+
+        self.contact_sheet = ContactSheet(atlas, start_index, self.tileset.ids_by_sprite, zoom_bucket(self.zoom_level))
+        self.canvas.configure(scrollregion=(0, 0, self.contact_sheet.width, self.contact_sheet.height))
+        self.render_sheet_viewport()
+
+    def render_sheet_viewport(self):
+        # Redraw only what is visible: one image the size of the canvas, placed at the current scroll position
+        self.sheet_render_pending = False
+        if self.contact_sheet is None:
+            return
+        x = int(self.canvas.canvasx(0))
+        y = int(self.canvas.canvasy(0))
+        with perf_stats.timer("contact sheet"):
+            viewport = self.contact_sheet.render(x, y, self.canvas.winfo_width(), self.canvas.winfo_height())
+        with perf_stats.timer("photoimage"):
+            photo_img = ImageTk.PhotoImage(viewport)
+        with perf_stats.timer("canvas draw"):
+            self.canvas.delete("all")
+            self.canvas.create_image(x, y, image=photo_img, anchor=tk.NW)
+        self.displayed_photos = [photo_img]
+
+    def schedule_sheet_render(self):
+        if self.contact_sheet is not None and not self.sheet_render_pending:
+            self.sheet_render_pending = True
+            self.root.after_idle(self.render_sheet_viewport)
+
+    def on_canvas_yview(self, *args):
+        self.canvas.yview(*args)
+        self.schedule_sheet_render()
+
+    def on_canvas_xview(self, *args):
+        self.canvas.xview(*args)
+        self.schedule_sheet_render()
+
+    def on_canvas_configure(self, event):
+        self.schedule_sheet_render()
+
+    def on_canvas_double_click(self, event):
+        # On a contact sheet, opens the tile named under the clicked sprite
+        if self.contact_sheet is None:
+            return
+        cell = self.contact_sheet.cell_at(int(self.canvas.canvasx(event.x)), int(self.canvas.canvasy(event.y)))
+        tile_id = self.contact_sheet.cell_tile_ids[cell] if cell is not None else None
+        if tile_id is None:
+            return
+        file_node = self.file_nodes.get(self.current_sheet)
+        item = self.node_items.get(file_node, {}).get(tile_id)
+        if item is not None:
+            self.tree.selection_set(item) # on_tile_select draws it
+            self.tree.see(item)
+            return
+        self.current_tile_id = tile_id
+        self.current_sheet = None
+        self.canvas.xview_moveto(0)
+        self.canvas.yview_moveto(0)
+        self.display_current_tile()
+
+    def on_canvas_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.canvas.yview_scroll(-1, "units")
+        else:
+            self.canvas.yview_scroll(1, "units")
+        self.schedule_sheet_render()
+
+    def toggle_perf_stats(self):
+        if self.perf_var.get():
+            self.perf_frame.pack(side=tk.BOTTOM, fill=tk.X, before=self.button_frame)
+            self.refresh_perf_stats()
+        else:
+            self.perf_frame.pack_forget()
+
+    def refresh_perf_stats(self):
+        if not self.perf_var.get():
+            return
+        self.perf_label.configure(text=perf_stats.summary())
+        self.root.after(PERF_REFRESH_MS, self.refresh_perf_stats)
+
+    def reset_perf_stats(self):
+        # Start the percentiles afresh, e.g. right before the interaction being measured
+        perf_stats.clear()
+        self.perf_label.configure(text=perf_stats.summary())
+
+    def save_perf_stats(self):
+        file_path = filedialog.asksaveasfilename(
+            initialdir=".",
+            title="Save Timings",
+            defaultextension=".json",
+            filetypes=(("JSON files", "*.json"), ("All files", "*.*"))
+        )
+        if not file_path:
+            return
+        try:
+            perf_stats.dump(file_path)
+        except OSError as e:
+            messagebox.showerror("Error saving timings", str(e))
+
+    def open_map_preview(self):
+        MapPreviewWindow(self.root, self.tileset, self.renderer)
+
+    def show_sprite_report(self):
+        if self.partial_loader is not None or self.sprite_report_loader is not None:
+            return
+        self.sprite_report_loader = SpriteReportLoader(self.tileset)
+        self.sprite_report_loader.start()
+        self.sprite_report_button.configure(state=tk.DISABLED, text="Sprite Report...")
+        self.root.after(LOAD_POLL_MS, self.poll_sprite_report, self.sprite_report_loader)
+
+    def poll_sprite_report(self, loader):
+        if loader is not self.sprite_report_loader:
+            return # Another pack was loaded meanwhile; this report is about the old one
+        try:
+            message = loader.messages.get_nowait()
+        except queue.Empty:
+            self.root.after(LOAD_POLL_MS, self.poll_sprite_report, loader)
+            return
+        self.end_sprite_report()
+        if message[0] == "error":
+            messagebox.showerror("Error building sprite report", str(message[1]))
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Sprite Report")
+        text = tk.Text(window, wrap=tk.NONE, width=80, height=30)
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=text.yview)
+        text.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        text.insert(tk.END, message[1])
+        text.configure(state=tk.DISABLED)
+
+    def end_sprite_report(self):
+        self.sprite_report_loader = None
+        self.sprite_report_button.configure(text="Sprite Report",
+                                            state=tk.DISABLED if self.partial_loader is not None else tk.NORMAL)
 
     def extract_tile(self):
         if not self.current_displayed_image:
@@ -422,148 +3142,301 @@ class TileViewerApp:
 
     def on_zoom_slide(self, value):
         self.zoom_level = float(value)
+        # Coalesce slider motion: however many events arrive, redraw once when Tk goes idle
+        if not self.zoom_render_pending:
+            self.zoom_render_pending = True
+            self.root.after_idle(self.render_pending_zoom)
+
+    def render_pending_zoom(self):
+        self.zoom_render_pending = False
         self.display_current_tile()
 
+    def schedule_search(self, event=None):
+        # Debounce typing: only search once the user pauses
+        if event is not None and event.keysym == "Return":
+            return # Handled immediately by the <Return> binding
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.search_tiles)
+
     def search_tiles(self, event=None): # Added event=None for binding
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+            self.search_after_id = None
+
+        if self.partial_loader is not None:
+            return # The search index only exists once the load is done, which runs the search again
+
         search_term = self.search_entry.get().lower()
         if not search_term:
-            self.populate_treeview() # If search term is empty, show all tiles
+            self.last_search = None
+            self.update_treeview(self.sorted_tiles_by_file) # If search term is empty, show all tiles
             return
 
-        filtered_tiles_by_file = {}
-        for file_name, tile_ids in self.tiles_by_file.items():
-            filtered_ids = {tile_id for tile_id in tile_ids if search_term in tile_id.lower()}
-            if filtered_ids:
-                filtered_tiles_by_file[file_name] = filtered_ids
-
-        self.populate_treeview(filtered_tiles_by_file)
+        if self.last_search is not None and self.last_search[0] == search_term:
+            return
+        with perf_stats.timer("search"):
+            positions = self.search_index.search(search_term, self.last_search)
+            self.last_search = (search_term, positions)
+            self.update_treeview(self.search_index.group_by_file(positions, self.sorted_tiles_by_file))
 
     def clear_search(self):
         self.search_entry.delete(0, tk.END)
-        self.populate_treeview() # Show all tiles
+        self.search_tiles() # Show all tiles
 
 
+    def display_rows(self):
+        # (pack name, tileset, renderer) of every row display_tile draws; the name is None for a single pack
+        if self.pack_set is not None:
+            return list(zip(self.pack_set.names, self.pack_set.tilesets, self.pack_renderers))
+        return [(None, self.tileset, self.renderer)]
+
+    def pick_random_variant(self):
+        # Outlines the variant group the game could pick for the shown tile, one weighted draw per pack
+        self.canvas.delete("random_pick")
+        if not self.current_tile_id:
+            return
+        for row, (_, tileset, _) in enumerate(self.display_rows()):
+            group = tileset.sample_variant(self.current_tile_id)
+            variant_table = tileset.tiles_data.variant_tables.get(tileset.resolve(self.current_tile_id))
+            position = variant_table.group_list.index(group) if variant_table else 0
+            for box_row, box_group, x0, y0, x1, y1 in self.variant_boxes:
+                if box_row == row and box_group == position:
+                    self.canvas.create_rectangle(x0 - 3, y0 - 3, x1 + 3, y1 + 3, outline="red", width=2, tags="random_pick")
+
     def display_tile(self, tile_id_to_display):
         self.canvas.delete("all")
+        self.variant_boxes = [] # (row, group position, x0, y0, x1, y1) of every drawn variant, for pick_random_variant
+        self.contact_sheet = None
+        self.canvas.configure(scrollregion=(0, 0, 0, 0))
         self.displayed_photos = [] # Clear previous images
-        self.tile_images = {} # Clear image cache for display
         self.current_displayed_image = None # Clear previous combined image
 
         x_offset, y_offset = 10, 10
-        max_row_height = 0
-        combined_image_width = 0
-        combined_image_height = 0
-        sprite_images = [] # Store individual sprite images before combining
-
-        sprites_to_display = self.tiles_data.get(tile_id_to_display, [])
-
-        if not sprites_to_display:
-            self.canvas.create_text(10, 10, text=f"Tile ID '{tile_id_to_display}' not found in parsed data.", anchor=tk.NW)
-            return
-
-        # First pass: Load and crop all sprites, calculate combined image size
-        for sprite_info in sprites_to_display:
-            image_name = sprite_info["image"]
-            global_sprite_index = sprite_info["global_sprite_index"]
-            sprite_width = sprite_info["sprite_width"]
-            sprite_height = sprite_info["sprite_height"]
-
-            # Load image only if not already in cache
-            if image_name not in self.tile_images:
-                image_path = os.path.join(self.base_dir, image_name)
-                try:
-                    img = Image.open(image_path).convert("RGBA")
-                    self.tile_images[image_name] = img
-                except FileNotFoundError:
-                    print(f"Error: Image file not found for display: {image_path}")
-                    continue
-                except Exception as e:
-                    print(f"Error loading image for display {image_path}: {e}")
-                    continue
-
-            img = self.tile_images.get(image_name)
-
-            if img:
-                try:
-                    # Find the sprite range for this image to calculate local index
-                    start_index = -1
-                    for file_name, start, end, w, h in self.image_sprite_ranges:
-                        if file_name == image_name:
-                            start_index = start
-                            break
-
-                    if start_index != -1:
-                        local_sprite_index = global_sprite_index - (start_index - 1)
-
-                        # Calculate sprite grid position
-                        sprites_per_row = img.width // sprite_width
-                        row = (local_sprite_index - 1) // sprites_per_row
-                        col = (local_sprite_index - 1) % sprites_per_row
-
-                        # Calculate cropping coordinates (x1, y1, x2, y2)
-                        x1 = col * sprite_width
-                        y1 = row * sprite_height
-                        x2 = x1 + sprite_width
-                        y2 = y1 + sprite_height
-
-                        # Ensure coordinates are within image bounds
-                        if x1 >= 0 and y1 >= 0 and x2 <= img.width and y2 <= img.height:
-                            # Crop the sprite from the image
-                            sprite_img = img.crop((x1, y1, x2, y2))
-                            sprite_images.append(sprite_img)
-
-                            # Calculate combined image size (simple row layout)
-                            combined_image_width += sprite_img.width + 20 # Add spacing
-                            combined_image_height = max(combined_image_height, sprite_img.height)
-
-                        else:
-                            print(f"Warning: Calculated coordinates for global sprite index {global_sprite_index} ({image_name}) are out of bounds during display.")
-                    else:
-                         print(f"Error: Could not find sprite range for image {image_name} during display.")
-
-
-                except Exception as e:
-                    print(f"Error processing sprite for {tile_id_to_display}: {e}")
-
-        # Create a blank image to paste sprites onto
-        if sprite_images:
-            self.current_displayed_image = Image.new("RGBA", (combined_image_width + 10, combined_image_height + 10)) # Add padding
-
-            # Second pass: Paste sprites onto the combined image and display on canvas
-            paste_x_offset = 10
-            for sprite_img in sprite_images:
-                 # Apply zoom to the sprite image before displaying and pasting
-                if self.zoom_level != 1.0:
-                    new_width = int(sprite_img.width * self.zoom_level)
-                    new_height = int(sprite_img.height * self.zoom_level)
-                    scaled_sprite_img = sprite_img.resize((new_width, new_height), Image.Resampling.NEAREST) # Use NEAREST for pixel art
-                else:
-                    scaled_sprite_img = sprite_img
-
-                photo_img = ImageTk.PhotoImage(scaled_sprite_img)
-
-                # Display the sprite on the canvas with offset
-                self.canvas.create_image(x_offset , y_offset , image=photo_img, anchor=tk.NW)
+        zoom_level = zoom_bucket(self.zoom_level)
+        combined_rows = [] # Composited RGBA arrays of each drawn row, for the combined image
+
+        for row, (pack_name, tileset, renderer) in enumerate(self.display_rows()):
+            variants = renderer.variants(tile_id_to_display)
+
+            if pack_name is not None:
+                self.canvas.create_text(10, y_offset, text=pack_name if variants else f"{pack_name}: missing", anchor=tk.NW)
+                y_offset += 20
+            if not variants:
+                if pack_name is None:
+                    self.canvas.create_text(10, 10, text=f"Tile ID '{tile_id_to_display}' not found in parsed data.", anchor=tk.NW)
+                    return
+                continue
 
-                # Paste onto the combined image
-                self.current_displayed_image.paste(sprite_img, (paste_x_offset, 10), sprite_img) # Paste original size for extraction
-                paste_x_offset += sprite_img.width + 20
+            resolved_tile_id = tileset.resolve(tile_id_to_display)
+            if resolved_tile_id != tile_id_to_display:
+                self.canvas.create_text(10, y_offset, text=f"Drawn with looks_like fallback '{resolved_tile_id}'", anchor=tk.NW)
+                y_offset += 20
+
+            # First pass: Composite bg under fg for every variant
+            variant_arrays = [] # (variant, label, group position, composited RGBA array)
+            for variant, (label, _, _, _, group) in enumerate(variants):
+                composited = renderer.composite(tile_id_to_display, variant)
+                if composited is not None:
+                    variant_arrays.append((variant, label, group, composited))
+            if not variant_arrays:
+                continue
+            combined_rows.append([composited for _, _, _, composited in variant_arrays])
+
+            # Second pass: Display variants on canvas, reusing scaled images from earlier draws
+            x_offset = 10
+            max_row_height = 0
+            for variant, label, group, composited in variant_arrays:
+                scaled_sprite_img, photo_img = self.scaled_cache.get(renderer.composite_key(tile_id_to_display, variant), composited, zoom_level)
+                self.variant_boxes.append((row, group, x_offset, y_offset,
+                                           x_offset + scaled_sprite_img.width, y_offset + scaled_sprite_img.height))
+
+                # Display the variant on the canvas with offset
+                with perf_stats.timer("canvas draw"):
+                    self.canvas.create_image(x_offset , y_offset , image=photo_img, anchor=tk.NW)
+                    if label:
+                        self.canvas.create_text(x_offset, y_offset + scaled_sprite_img.height + 2, text=label, anchor=tk.NW)
 
                 # Keep a reference to the PhotoImage to prevent garbage collection
                 self.displayed_photos.append(photo_img)
 
                 # Adjust offset and max height based on scaled image size for canvas display
                 x_offset += scaled_sprite_img.width + 20
-                max_row_height = max(max_row_height, scaled_sprite_img.height + 25)
+                label_height = 15 * (label.count("\n") + 1) if label else 0
+                max_row_height = max(max_row_height, scaled_sprite_img.height + 25 + label_height)
 
                 # Move to the next row if needed (simple wrapping)
                 if x_offset + scaled_sprite_img.width > self.canvas.winfo_width() and self.canvas.winfo_width() > 0:
                     x_offset = 10
                     y_offset += max_row_height
                     max_row_height = 0
+            y_offset += max_row_height
+
+        # Build the combined image for extraction straight from the composited arrays, one row per pack
+        if combined_rows:
+            self.current_displayed_image = combine_rows(combined_rows)
+
+        self.canvas.configure(scrollregion=self.canvas.bbox("all") or (0, 0, 0, 0))
+
+EXPORT_COMPOSITE_CACHE = 64 # Composited variants kept per export worker; exports never revisit a tile
+
+export_tileset = None # Tileset loaded once per export worker process
+
+def safe_file_name(tile_id):
+    # Tile IDs can contain characters (like the ":" of sub-tiles) that aren't allowed in file names
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", tile_id)
+
+def export_sheet_of(tileset, tile_id):
+    # The sheet an export of tile_id is grouped under: the sheet of its first sprite
+    resolved_tile_id = tileset.resolve(tile_id)
+    if resolved_tile_id is None:
+        return None
+    start, _ = tileset.tiles_data.slices[resolved_tile_id]
+    return tileset.image_sprite_ranges.ranges[tileset.tiles_data.sheet_ids[start]][0]
+
+def export_file_names(tileset, tile_ids):
+    # tile_id -> one PNG name per variant, unique across the whole run. Different IDs can sanitize to the same
+    # name ("t_wall:corner" and "t_wall_corner"), or differ only in case, so later ones get a "-2", "-3"... suffix.
+    renderer = TileRenderer(tileset, None) # variants() only reads tiles_data
+    used = set() # Case-folded, for case-insensitive file systems
+    names = {}
+    for tile_id in tile_ids:
+        variant_count = len(renderer.variants(tile_id))
+        tile_names = []
+        for variant in range(variant_count):
+            base = safe_file_name(tile_id) + (f"_{variant}" if variant_count > 1 else "")
+            name = f"{base}.png"
+            counter = 2
+            while name.casefold() in used:
+                name = f"{base}-{counter}.png"
+                counter += 1
+            used.add(name.casefold())
+            tile_names.append(name)
+        names[tile_id] = tile_names
+    return names
+
+def export_tiles(tileset, tile_names, output_dir, sheet_cache_budget=SHEET_CACHE_BUDGET):
+    # Writes every variant of every tile in tile_names (from export_file_names) as a PNG; returns the number of files written
+    renderer = TileRenderer(tileset, SheetCache(sheet_cache_budget), max_entries=EXPORT_COMPOSITE_CACHE, share_identical=False)
+    written = 0
+    for tile_id, file_names in tile_names.items():
+        for variant, file_name in enumerate(file_names):
+            composited = renderer.composite(tile_id, variant)
+            if composited is None:
+                continue
+            Image.fromarray(composited, "RGBA").save(os.path.join(output_dir, file_name))
+            written += 1
+    return written
+
+def init_export_worker(config_path):
+    # Each worker process loads the tileset once; the parent already wrote the compiled cache, so this is fast
+    global export_tileset
+    export_tileset = load_tileset(config_path)
+
+def export_sheet_worker(job):
+    file_name, tile_names, output_dir, sheet_cache_budget = job
+    return file_name, len(tile_names), export_tiles(export_tileset, tile_names, output_dir, sheet_cache_budget)
+
+def export_command(args):
+    start_time = time.perf_counter()
+    tileset = load_tileset(args.config)
+
+    if args.filter:
+        positions = tileset.search_index.search(args.filter.lower())
+        tile_ids = [tileset.search_index.tile_ids[position] for position in positions]
+    else:
+        tile_ids = list(tileset.search_index.tile_ids)
+
+    # One job per sheet, so each sheet is decoded by a single worker
+    tiles_by_sheet = {}
+    for tile_id in tile_ids:
+        file_name = export_sheet_of(tileset, tile_id)
+        if file_name is not None:
+            tiles_by_sheet.setdefault(file_name, []).append(tile_id)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = max(1, min(args.jobs, len(tiles_by_sheet)))
+    sheet_cache_budget = SHEET_CACHE_BUDGET // jobs # Keeps total decoded-sheet memory bounded across workers
+    # Names are picked here, before any worker writes, so no two tiles can overwrite each other's files
+    file_names = export_file_names(tileset, [tile_id for sheet_tile_ids in tiles_by_sheet.values() for tile_id in sheet_tile_ids])
+    work = [(file_name, {tile_id: file_names[tile_id] for tile_id in sheet_tile_ids}, args.output_dir, sheet_cache_budget)
+            for file_name, sheet_tile_ids in tiles_by_sheet.items()]
+
+    total_tiles = 0
+    total_images = 0
+    def report(result):
+        nonlocal total_tiles, total_images
+        file_name, tile_count, image_count = result
+        total_tiles += tile_count
+        total_images += image_count
+        print(f"{file_name}: {tile_count} tiles, {image_count} images")
+
+    if jobs == 1:
+        init_export_worker(args.config)
+        for job in work:
+            report(export_sheet_worker(job))
+    else:
+        with multiprocessing.Pool(jobs, initializer=init_export_worker, initargs=(args.config,)) as pool:
+            for result in pool.imap_unordered(export_sheet_worker, work):
+                report(result)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Exported {total_images} images for {total_tiles} tiles to {args.output_dir} "
+          f"in {elapsed:.1f}s ({total_tiles / max(elapsed, 1e-9):.0f} tiles/s, {jobs} jobs)")
+    return 0
+
+def report_command(args):
+    tileset = load_tileset(args.config)
+    usage = tileset_sprite_usage(tileset, SheetCache(0))
+    if args.json:
+        json.dump(usage, sys.stdout, indent=2)
+        print()
+    else:
+        print(sprite_usage_report(usage))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CDDA tileset viewer. Run without arguments to open the viewer window.")
+    subparsers = parser.add_subparsers(dest="command")
+    export_parser = subparsers.add_parser("export", help="export tiles to PNG files without opening a window")
+    export_parser.add_argument("config", help="path to the pack's tile_config.json")
+    export_parser.add_argument("output_dir", help="directory to write the PNG files to")
+    export_parser.add_argument("--filter", help="only export tile IDs matching this search (same syntax as the search box)")
+    export_parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes, one sheet each (default: CPU count)")
+    report_parser = subparsers.add_parser("report", help="list duplicate and unreferenced sprites of every sheet")
+    report_parser.add_argument("config", help="path to the pack's tile_config.json")
+    report_parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--profile", metavar="PATH", default=os.environ.get("TILE_VIEWER_PROFILE"),
+                        help="run the main thread under cProfile and write its stats to PATH (env: TILE_VIEWER_PROFILE)")
+    parser.add_argument("--perf-log", metavar="PATH", default=os.environ.get("TILE_VIEWER_PERF_LOG"),
+                        help="write hot-path timings and cache hit rates to PATH on exit (env: TILE_VIEWER_PERF_LOG)")
+    args = parser.parse_args(argv)
+
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return run_command(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile) # Read with: python -m pstats PATH
+        if args.perf_log:
+            perf_stats.dump(args.perf_log)
+
+def run_command(args):
+    if args.command == "export":
+        return export_command(args)
+    if args.command == "report":
+        return report_command(args)
 
-
-if __name__ == "__main__":
     root = tk.Tk()
     app = TileViewerApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support() # Needed for worker processes in the frozen executable
+    sys.exit(main())
\ No newline at end of file